@@ -0,0 +1,18 @@
+"""
+ASGI entry point – Salon AI Voice Agent.
+
+Applies fastapi-deferred-init before the application is imported so route
+dependants and response fields are computed lazily on first request
+instead of eagerly at ``include_router`` time. Run with:
+
+    uvicorn app.asgi:app
+"""
+
+from fastapi_deferred_init import apply_patch
+
+# Must run before anything imports FastAPI's routing classes.
+apply_patch()
+
+from app.main import app  # noqa: E402
+
+__all__ = ["app"]
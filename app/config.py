@@ -3,56 +3,99 @@ Configuration management for the Salon AI Voice Agent.
 Loads all API keys and settings from environment variables.
 """
 
-from pydantic_settings import BaseSettings
-from pydantic import Field
+import os
+from dataclasses import dataclass
 from functools import lru_cache
 
+from dotenv import load_dotenv
 
-class Settings(BaseSettings):
-    """Application settings loaded from .env file."""
+# Populate os.environ from .env (real environment variables take precedence)
+load_dotenv(".env", encoding="utf-8")
 
-    # ── OpenRouter ─────────────────────────────────────
-    openrouter_api_key: str = Field(..., description="OpenRouter API key")
-    openrouter_model: str = Field(
-        default="openai/gpt-4o", description="LLM model to use via OpenRouter"
+
+def _require(name: str) -> str:
+    """Read a required environment variable."""
+    value = os.environ.get(name)
+    if value is None:
+        raise RuntimeError(f"Missing required environment variable: {name}")
+    return value
+
+
+def _cache_dir(name: str) -> str:
+    """Default location for a cache, under the user's cache directory."""
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
     )
+    return os.path.join(base, "salon-agent", name)
+
+
+@dataclass(frozen=True, slots=True)
+class Settings:
+    """Application settings loaded from the environment / .env file."""
+
+    # ── OpenRouter ─────────────────────────────────────
+    openrouter_api_key: str  # OpenRouter API key
+    openrouter_model: str  # LLM model to use via OpenRouter
+    openrouter_max_concurrency: int  # Max in-flight OpenRouter requests
 
     # ── ElevenLabs ─────────────────────────────────────
-    elevenlabs_api_key: str = Field(..., description="ElevenLabs API key")
-    elevenlabs_voice_id: str = Field(
-        default="21m00Tcm4TlvDq8ikWAM",  # Rachel voice
-        description="ElevenLabs voice ID for TTS",
-    )
+    elevenlabs_api_key: str  # ElevenLabs API key
+    elevenlabs_voice_id: str  # ElevenLabs voice ID for TTS
+    elevenlabs_max_concurrency: int  # Max in-flight ElevenLabs requests (plan limit)
 
     # ── Twilio ─────────────────────────────────────────
-    twilio_account_sid: str = Field(..., description="Twilio Account SID")
-    twilio_auth_token: str = Field(..., description="Twilio Auth Token")
-    twilio_phone_number: str = Field(..., description="Twilio phone number")
+    twilio_account_sid: str  # Twilio Account SID
+    twilio_auth_token: str  # Twilio Auth Token
+    twilio_phone_number: str  # Twilio phone number
 
     # ── Google Calendar ────────────────────────────────
-    google_calendar_id: str = Field(..., description="Google Calendar ID")
-    google_service_account_file: str = Field(
-        default="credentials/service_account.json",
-        description="Path to Google service account JSON",
-    )
+    google_calendar_id: str  # Google Calendar ID
+    google_service_account_file: str  # Path to Google service account JSON
 
     # ── Salon Configuration ────────────────────────────
-    salon_name: str = Field(default="Luxe Beauty Salon", description="Salon name")
-    salon_timezone: str = Field(
-        default="America/Los_Angeles", description="Salon timezone"
-    )
-    salon_phone: str = Field(default="+1234567890", description="Salon phone number")
+    salon_name: str  # Salon name
+    salon_timezone: str  # Salon timezone
+    salon_phone: str  # Salon phone number
 
     # ── Logging ────────────────────────────────────────
-    log_level: str = Field(default="INFO", description="Logging level")
-    log_file: str = Field(
-        default="logs/interactions.jsonl", description="Path to interaction log file"
-    )
+    log_level: str  # Logging level
+    log_file: str  # Path to interaction log file
+    log_max_bytes: int  # Rotate + gzip the interaction log past this size (0 = off)
+
+    # ── Caches ─────────────────────────────────────────
+    tts_cache_dir: str  # Synthesized fixed phrases (greeting, tool acks)
+    rag_store_dir: str  # Persisted knowledge-base embeddings
 
-    model_config = {"env_file": ".env", "env_file_encoding": "utf-8"}
+    @classmethod
+    def from_env(cls) -> "Settings":
+        """Build settings from environment variables."""
+        env = os.environ.get
+        return cls(
+            openrouter_api_key=_require("OPENROUTER_API_KEY"),
+            openrouter_model=env("OPENROUTER_MODEL", "openai/gpt-4o"),
+            openrouter_max_concurrency=int(env("OPENROUTER_MAX_CONCURRENCY", "32")),
+            elevenlabs_api_key=_require("ELEVENLABS_API_KEY"),
+            elevenlabs_voice_id=env("ELEVENLABS_VOICE_ID", "21m00Tcm4TlvDq8ikWAM"),  # Rachel voice
+            elevenlabs_max_concurrency=int(env("ELEVENLABS_MAX_CONCURRENCY", "10")),
+            twilio_account_sid=_require("TWILIO_ACCOUNT_SID"),
+            twilio_auth_token=_require("TWILIO_AUTH_TOKEN"),
+            twilio_phone_number=_require("TWILIO_PHONE_NUMBER"),
+            google_calendar_id=_require("GOOGLE_CALENDAR_ID"),
+            google_service_account_file=env(
+                "GOOGLE_SERVICE_ACCOUNT_FILE", "credentials/service_account.json"
+            ),
+            salon_name=env("SALON_NAME", "Luxe Beauty Salon"),
+            salon_timezone=env("SALON_TIMEZONE", "America/Los_Angeles"),
+            salon_phone=env("SALON_PHONE", "+1234567890"),
+            log_level=env("LOG_LEVEL", "INFO"),
+            log_file=env("LOG_FILE", "logs/interactions.jsonl"),
+            log_max_bytes=int(env("LOG_MAX_BYTES", str(10 * 1024 * 1024))),
+            tts_cache_dir=env("TTS_CACHE_DIR", _cache_dir("tts")),
+            rag_store_dir=env("RAG_STORE_DIR", _cache_dir("rag")),
+        )
 
 
 @lru_cache()
 def get_settings() -> Settings:
     """Get cached application settings."""
-    return Settings()
+    return Settings.from_env()
@@ -1,40 +1,292 @@
 """
 Interaction Logger – records all call interactions for QA and training.
 
-Logs to a JSONL file for easy parsing and analysis.
+Logs to JSONL files for easy parsing and analysis. Entries are sharded by
+call SID across a fixed set of files so concurrent calls do not contend on
+a single handle; ``merge_logs()`` consolidates them offline. Once a shard
+grows past the configured size it is rotated and gzip-compressed.
 """
 
-import json
-import logging
+import asyncio
+import atexit
+import gzip
 import os
-from datetime import datetime, timezone
+import shutil
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Optional
 
+import picologging as logging
+import orjson
+
 from app.config import get_settings
 
 logger = logging.getLogger(__name__)
 
+# Background writer batching: wait this long after the first queued entry so
+# concurrent calls can coalesce into a single write, capped at this many lines.
+WRITER_BATCH_WINDOW_SECONDS = 0.05
+WRITER_BATCH_MAX_ENTRIES = 256
+
+# Group commit: fsync once per this many entries or this much time,
+# whichever comes first, instead of after every line.
+FSYNC_EVERY_ENTRIES = 32
+FSYNC_INTERVAL_SECONDS = 1.0
+
+# Number of shard files; a power of two so the shard is a cheap bit mask.
+LOG_SHARDS = 8
+
+# Pre-encoded constant head of every interaction log line.
+_ENTRY_PREFIX = b'{"direction":"inbound","call_sid":'
+
+
+def _shard_path(log_path: Path, index: int) -> Path:
+    """Path of shard ``index`` for a log file, e.g. ``interactions.3.jsonl``."""
+    return log_path.with_name(f"{log_path.stem}.{index}{log_path.suffix}")
+
+
+def _shard_index(call_sid: str) -> int:
+    """Stable shard for a call SID, so a call's entries stay in one file."""
+    return zlib.crc32(call_sid.encode()) & (LOG_SHARDS - 1)
+
+
+def _gzip_segment(segment: Path):
+    """Compress a closed log segment to ``<segment>.gz`` and remove the original."""
+    try:
+        with open(segment, "rb") as src, gzip.open(
+            f"{segment}.gz", "wb", compresslevel=1
+        ) as dst:
+            shutil.copyfileobj(src, dst)
+        segment.unlink()
+    except Exception as e:
+        logger.error(f"Failed to compress log segment {segment}: {e}")
+
+
+class GzipRotatingFile:
+    """
+    Append-only JSONL file that rotates once it reaches ``max_bytes``.
+
+    The active segment stays plain text for cheap appends; closed segments
+    are renamed with a timestamp suffix and gzipped on a background thread.
+    """
+
+    def __init__(self, path: Path, max_bytes: int):
+        self._path = path
+        self._max_bytes = max_bytes
+        self._compressor: Optional[ThreadPoolExecutor] = None
+        self._fh = open(self._path, "ab", buffering=8192)
+        self._size = self._path.stat().st_size
+
+    @property
+    def closed(self) -> bool:
+        return self._fh.closed
+
+    def write(self, data: bytes):
+        """Append data, rotating the segment if it is now over the limit."""
+        self._fh.write(data)
+        self._size += len(data)
+        if self._max_bytes and self._size >= self._max_bytes:
+            self._rotate()
+
+    def flush(self):
+        """Flush buffered data and fsync the active segment to disk."""
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+
+    def _rotate(self):
+        """Close the active segment and hand it off for compression."""
+        # The next group commit only syncs the new segment, so sync this
+        # one now or its last entries are not durable.
+        self.flush()
+        self._fh.close()
+        segment = self._path.with_name(f"{self._path.name}.{time.time_ns()}")
+        os.replace(self._path, segment)
+        if self._compressor is None:
+            self._compressor = ThreadPoolExecutor(
+                max_workers=1, thread_name_prefix="log-gzip"
+            )
+        self._compressor.submit(_gzip_segment, segment)
+        self._fh = open(self._path, "ab", buffering=8192)
+        self._size = 0
+
+    def close(self):
+        """Close the active segment and wait for pending compressions."""
+        self._fh.close()
+        if self._compressor is not None:
+            self._compressor.shutdown(wait=True)
+            self._compressor = None
+
 
 class InteractionLogger:
-    """Logs all call interactions to a JSONL file."""
+    """Logs all call interactions to rotating JSONL files sharded by call SID."""
 
     def __init__(self):
         self._log_path: Optional[Path] = None
-        self._initialized = False
+        self._fhs: list[GzipRotatingFile] = []
+        self._locks = [threading.Lock() for _ in range(LOG_SHARDS)]
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._queue: Optional[asyncio.Queue] = None
+        self._writer_task: Optional[asyncio.Task] = None
+        self._unsynced_entries = [0] * LOG_SHARDS
+        self._last_sync = time.monotonic()
+        self._atexit_registered = False
+        # Until initialize() runs, calls go through a lazy-init shim; once
+        # initialized the shim is dropped so the hot path has no init check.
+        self.log_interaction = self._initialize_then_log
 
     def initialize(self):
-        """Set up the log file path and ensure the directory exists."""
+        """Set up the log file path and open each shard once in append mode."""
+        if self._fhs:
+            # Already open, e.g. lazily before the server started: keep the
+            # shards, but move writes off the call path if a loop now runs.
+            self._start_writer()
+            return
         settings = get_settings()
         self._log_path = Path(settings.log_file)
         self._log_path.parent.mkdir(parents=True, exist_ok=True)
-        self._initialized = True
+        # Keep the shard handles open for the life of the process instead of
+        # paying open/close syscalls on every logged event.
+        self._fhs = [
+            GzipRotatingFile(_shard_path(self._log_path, i), settings.log_max_bytes)
+            for i in range(LOG_SHARDS)
+        ]
+        if not self._atexit_registered:
+            atexit.register(self.close)
+            self._atexit_registered = True
+        self._start_writer()
+
+        self.__dict__.pop("log_interaction", None)
         logger.info(f"Interaction logger initialized: {self._log_path}")
 
-    def _ensure_initialized(self):
-        """Lazy initialization."""
-        if not self._initialized:
-            self.initialize()
+    def _start_writer(self):
+        """
+        Start the background writer task, unless it is already running.
+
+        When started from the server's event loop, writes go to a background
+        task so disk I/O never runs on the call hot path. Without a running
+        loop (scripts, tests) entries are written inline.
+        """
+        if self._writer_task is not None and not self._writer_task.done():
+            return
+        try:
+            self._loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._loop = None
+        if self._loop is not None:
+            self._queue = asyncio.Queue()
+            self._writer_task = self._loop.create_task(self._writer_loop())
+
+    async def _writer_loop(self):
+        """Drain queued log lines, coalescing bursts into one write per shard."""
+        while True:
+            try:
+                first = await asyncio.wait_for(
+                    self._queue.get(), FSYNC_INTERVAL_SECONDS
+                )
+            except asyncio.TimeoutError:
+                # Traffic stopped: sync what the last batches left buffered
+                if any(self._unsynced_entries):
+                    await asyncio.to_thread(self.flush)
+                continue
+            batch = [first]
+            await asyncio.sleep(WRITER_BATCH_WINDOW_SECONDS)
+            while len(batch) < WRITER_BATCH_MAX_ENTRIES and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            by_shard: dict[int, list[bytes]] = {}
+            for index, line in batch:
+                by_shard.setdefault(index, []).append(line)
+            for index, lines in by_shard.items():
+                self._write(index, b"".join(lines), len(lines))
+            if self._sync_due():
+                await asyncio.to_thread(self.flush)
+            for _ in batch:
+                self._queue.task_done()
+            await asyncio.sleep(0)
+
+    def _write(self, index: int, data: bytes, entries: int = 1):
+        """Write already-serialized lines to one shard of the log."""
+        try:
+            with self._locks[index]:
+                self._fhs[index].write(data)
+                self._unsynced_entries[index] += entries
+        except Exception as e:
+            logger.error(f"Failed to write interaction log: {e}")
+
+    def _sync_due(self) -> bool:
+        """Whether enough entries or time have accumulated to fsync."""
+        unsynced = sum(self._unsynced_entries)
+        return unsynced >= FSYNC_EVERY_ENTRIES or (
+            unsynced > 0
+            and time.monotonic() - self._last_sync >= FSYNC_INTERVAL_SECONDS
+        )
+
+    def flush(self):
+        """Flush pending entries to the OS and fsync every dirty shard."""
+        for index, fh in enumerate(self._fhs):
+            try:
+                with self._locks[index]:
+                    if fh.closed or not self._unsynced_entries[index]:
+                        continue
+                    fh.flush()
+                    self._unsynced_entries[index] = 0
+            except Exception as e:
+                logger.error(f"Failed to flush interaction log: {e}")
+        self._last_sync = time.monotonic()
+
+    def _enqueue(self, index: int, line: bytes):
+        """Queue a line for the background writer, from any thread."""
+        if self._writer_task is None or self._writer_task.done():
+            self._write(index, line)
+            if self._sync_due():
+                self.flush()
+            return
+
+        try:
+            running_loop = asyncio.get_running_loop()
+        except RuntimeError:
+            running_loop = None
+
+        if running_loop is self._loop:
+            self._queue.put_nowait((index, line))
+            return
+
+        try:
+            self._loop.call_soon_threadsafe(self._queue.put_nowait, (index, line))
+        except RuntimeError:
+            # Event loop already closed (shutdown) – fall back to a direct write
+            self._write(index, line)
+
+    async def drain(self):
+        """Wait for queued entries to be written, then stop the writer task."""
+        if self._writer_task is None:
+            return
+        if not self._writer_task.done():
+            await self._queue.join()
+            self._writer_task.cancel()
+            try:
+                await self._writer_task
+            except asyncio.CancelledError:
+                pass
+        self._writer_task = None
+        self._queue = None
+
+    def close(self):
+        """Flush and close the shard file handles."""
+        self.flush()
+        for index, fh in enumerate(self._fhs):
+            with self._locks[index]:
+                if not fh.closed:
+                    fh.close()
+        self._fhs = []
+        self.log_interaction = self._initialize_then_log
+
+    def _initialize_then_log(self, *args, **kwargs):
+        """Lazy initialization on first use, then log normally."""
+        self.initialize()
+        self.log_interaction(*args, **kwargs)
 
     def log_interaction(
         self,
@@ -62,12 +314,10 @@ class InteractionLogger:
             duration_seconds: Duration of this exchange.
             extra: Any additional metadata.
         """
-        self._ensure_initialized()
-
+        # The constant leading keys are pre-encoded; only the variable fields
+        # go through the encoder, and the two pieces are spliced together.
         entry = {
-            "timestamp": datetime.now(timezone.utc).isoformat(),
-            "call_sid": call_sid,
-            "direction": "inbound",
+            "timestamp": time.time_ns(),
             "customer_phone": customer_phone,
             "customer_transcript": customer_transcript,
             "agent_response": agent_response,
@@ -80,11 +330,11 @@ class InteractionLogger:
         if extra:
             entry["extra"] = extra
 
-        try:
-            with open(self._log_path, "a") as f:
-                f.write(json.dumps(entry) + "\n")
-        except Exception as e:
-            logger.error(f"Failed to write interaction log: {e}")
+        body = orjson.dumps(entry, option=orjson.OPT_APPEND_NEWLINE)
+        self._enqueue(
+            _shard_index(call_sid),
+            _ENTRY_PREFIX + orjson.dumps(call_sid) + b"," + body[1:],
+        )
 
     def log_call_start(self, call_sid: str, customer_phone: Optional[str] = None):
         """Log the start of a new call."""
@@ -116,5 +366,44 @@ class InteractionLogger:
         )
 
 
+def merge_logs(
+    log_file: Optional[str] = None, output: Optional[str] = None
+) -> Path:
+    """
+    Consolidate all shards, including rotated segments, into one JSONL file.
+
+    Intended for offline use (QA exports, training data). Entries are
+    ordered by timestamp across shards.
+
+    Args:
+        log_file: Configured log path the shards were derived from.
+            Defaults to the ``LOG_FILE`` setting.
+        output: Destination file. Defaults to ``log_file`` itself, which
+            is never written to while sharding is in effect.
+
+    Returns:
+        Path of the merged file.
+    """
+    log_path = Path(log_file or get_settings().log_file)
+    output_path = Path(output) if output else log_path
+
+    entries = []
+    for segment in log_path.parent.glob(f"{log_path.stem}.*{log_path.suffix}*"):
+        if segment == output_path:
+            continue
+        opener = gzip.open if segment.suffix == ".gz" else open
+        with opener(segment, "rb") as f:
+            for line in f:
+                if line.strip():
+                    entries.append((orjson.loads(line)["timestamp"], line))
+
+    entries.sort(key=lambda entry: entry[0])
+    with open(output_path, "wb") as out:
+        out.writelines(line for _, line in entries)
+
+    logger.info(f"Merged {len(entries)} interaction log entries into {output_path}")
+    return output_path
+
+
 # Singleton instance
 interaction_logger = InteractionLogger()
@@ -5,27 +5,40 @@ Entry point for the server. Initializes all services on startup
 and mounts the API routes.
 """
 
-import logging
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
 
+import picologging as logging
+import orjson
 from fastapi import FastAPI
-from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
 
+from app.config import get_settings
+from app.middleware.cors import LeanCORSMiddleware
 from app.routes.voice import router as voice_router
+from app.services.call_orchestrator import call_orchestrator
 from app.services.rag_service import rag_service
 from app.services.calendar_service import calendar_service
 from app.services.voice_service import voice_service
 from app.services.llm_agent import llm_agent
+from app.services.http_client import shared_client
 from app.logger.interaction_logger import interaction_logger
 
 # ── Logging Setup ─────────────────────────────────────
 logging.basicConfig(
     level=logging.INFO,
-    format="%(asctime)s | %(levelname)-8s | %(name)s | %(message)s",
+    format="%(asctime)s | %(levelname)s | %(name)s | %(message)s",
     datefmt="%Y-%m-%d %H:%M:%S",
 )
 logger = logging.getLogger(__name__)
 
+# Worker threads behind asyncio.to_thread / run_in_executor(None). Every
+# blocking SDK call (STT, LLM, TTS, calendar) ends up here, so the pool is
+# sized for many concurrent calls rather than the CPU-count default.
+DEFAULT_EXECUTOR_WORKERS = 64
+
 
 # ── Lifespan ──────────────────────────────────────────
 @asynccontextmanager
@@ -35,41 +48,92 @@ async def lifespan(app: FastAPI):
     logger.info("  🏪 Salon AI Voice Agent – Starting Up")
     logger.info("=" * 60)
 
-    # Initialize services
-    try:
+    # Load settings once up front so a missing variable fails fast, before
+    # any service starts initializing in parallel.
+    get_settings()
+
+    asyncio.get_running_loop().set_default_executor(
+        ThreadPoolExecutor(
+            max_workers=DEFAULT_EXECUTOR_WORKERS, thread_name_prefix="blocking"
+        )
+    )
+
+    # Initialize services concurrently – they are independent and mostly
+    # I/O-bound (credential loads, client setup, embedding index build).
+    async def _init_rag():
         logger.info("Initializing RAG knowledge base...")
-        rag_service.initialize()
+        await asyncio.to_thread(rag_service.initialize)
 
+    async def _init_logger():
+        # Runs on the event loop so the background writer task can start.
         logger.info("Initializing interaction logger...")
         interaction_logger.initialize()
 
+    async def _init_llm():
         logger.info("Initializing LLM agent...")
-        llm_agent.initialize()
+        await asyncio.to_thread(llm_agent.initialize)
 
+    async def _init_voice():
         logger.info("Initializing voice service...")
-        voice_service.initialize()
+        await asyncio.to_thread(voice_service.initialize)
 
+    async def _init_calendar():
         logger.info("Initializing calendar service...")
-        try:
-            calendar_service.initialize()
-        except Exception as e:
-            logger.warning(
-                f"Calendar service init failed (expected if no credentials): {e}"
-            )
-            logger.warning("Calendar features will fail until credentials are configured.")
-
-        logger.info("=" * 60)
-        logger.info("  ✅ All services initialized – Ready for calls!")
-        logger.info("=" * 60)
-
-    except Exception as e:
-        logger.error(f"Startup failed: {e}")
-        raise
+        await asyncio.to_thread(calendar_service.initialize)
+
+    results = await asyncio.gather(
+        _init_rag(),
+        _init_logger(),
+        _init_llm(),
+        _init_voice(),
+        _init_calendar(),
+        return_exceptions=True,
+    )
+    rag_result, logger_result, llm_result, voice_result, calendar_result = results
+
+    if isinstance(calendar_result, Exception):
+        logger.warning(
+            f"Calendar service init failed (expected if no credentials): {calendar_result}"
+        )
+        logger.warning("Calendar features will fail until credentials are configured.")
+
+    failures = [
+        (name, result)
+        for name, result in (
+            ("RAG", rag_result),
+            ("interaction logger", logger_result),
+            ("LLM agent", llm_result),
+            ("voice service", voice_result),
+        )
+        if isinstance(result, Exception)
+    ]
+    for name, error in failures:
+        logger.error(f"Startup failed ({name}): {error}")
+    if failures:
+        raise failures[0][1]
+
+    # Synthesize the greeting in the background rather than on the first
+    # call; startup never waits on ElevenLabs, and a failure is retried
+    # per call.
+    threading.Thread(
+        target=call_orchestrator.warmup, name="greeting-warmup", daemon=True
+    ).start()
+
+    # Ends sessions whose hangup was never reported
+    reaper_task = asyncio.create_task(call_orchestrator.run_reaper())
+
+    logger.info("=" * 60)
+    logger.info("  ✅ All services initialized – Ready for calls!")
+    logger.info("=" * 60)
 
     yield  # Server is running
 
     # Shutdown
     logger.info("Shutting down Salon AI Voice Agent...")
+    reaper_task.cancel()
+    await interaction_logger.drain()
+    interaction_logger.close()
+    shared_client.close()
 
 
 # ── FastAPI App ───────────────────────────────────────
@@ -84,40 +148,43 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
-# CORS middleware
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
+# CORS middleware (no-op for Twilio webhooks and WebSockets)
+app.add_middleware(LeanCORSMiddleware)
 
 # Mount routes
 app.include_router(voice_router)
 
 
 # ── Health & Info Endpoints ───────────────────────────
+# Static payloads are serialized once; only the call count varies per hit.
+# A fresh Response is built per request since middleware may add headers.
+_HEALTH_BODY = orjson.dumps({"status": "healthy"})
+
+_ROOT_INFO = {
+    "service": "Salon AI Voice Agent",
+    "status": "running",
+    "endpoints": {
+        "incoming_call_webhook": "/voice/incoming",
+        "media_stream_ws": "/voice/stream",
+        "text_chat_test": "/voice/chat",
+        "health": "/health",
+        "docs": "/docs",
+    },
+}
+
+
 @app.get("/")
 async def root():
     """Root endpoint – health check and info."""
-    from app.services.call_orchestrator import call_orchestrator
-
-    return {
-        "service": "Salon AI Voice Agent",
-        "status": "running",
-        "active_calls": call_orchestrator.get_active_call_count(),
-        "endpoints": {
-            "incoming_call_webhook": "/voice/incoming",
-            "media_stream_ws": "/voice/stream",
-            "text_chat_test": "/voice/chat",
-            "health": "/health",
-            "docs": "/docs",
-        },
-    }
+    return Response(
+        content=orjson.dumps(
+            {**_ROOT_INFO, "active_calls": call_orchestrator.get_active_call_count()}
+        ),
+        media_type="application/json",
+    )
 
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint."""
-    return {"status": "healthy"}
+    return Response(content=_HEALTH_BODY, media_type="application/json")
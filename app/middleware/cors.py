@@ -0,0 +1,77 @@
+"""
+Lean CORS middleware.
+
+The voice endpoints are hit by Twilio (webhooks and the media WebSocket),
+not browsers, so most traffic carries no ``Origin`` header. This middleware
+passes those requests and all WebSocket traffic straight through, and only
+does CORS work for real browser requests. It allows any origin, method and
+header, with credentials – the same policy the app used with Starlette's
+``CORSMiddleware(allow_origins=["*"], allow_credentials=True, ...)``.
+"""
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+ALLOWED_METHODS = b"DELETE, GET, HEAD, OPTIONS, PATCH, POST, PUT"
+
+# Headers sent on every preflight response, built once.
+_PREFLIGHT_HEADERS = [
+    (
+        b"vary",
+        b"Origin, Access-Control-Request-Method, Access-Control-Request-Headers",
+    ),
+    (b"access-control-allow-methods", ALLOWED_METHODS),
+    (b"access-control-max-age", b"600"),
+    (b"access-control-allow-credentials", b"true"),
+    (b"content-type", b"text/plain; charset=utf-8"),
+    (b"content-length", b"2"),
+]
+_PREFLIGHT_BODY = {"type": "http.response.body", "body": b"OK"}
+
+
+class LeanCORSMiddleware:
+    """Allow-all CORS that short-circuits non-browser and WebSocket traffic."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        origin = None
+        request_method = None
+        request_headers = None
+        for name, value in scope["headers"]:
+            if name == b"origin":
+                origin = value
+            elif name == b"access-control-request-method":
+                request_method = value
+            elif name == b"access-control-request-headers":
+                request_headers = value
+
+        if origin is None:
+            await self.app(scope, receive, send)
+            return
+
+        if scope["method"] == "OPTIONS" and request_method is not None:
+            headers = [*_PREFLIGHT_HEADERS, (b"access-control-allow-origin", origin)]
+            if request_headers is not None:
+                headers.append((b"access-control-allow-headers", request_headers))
+            await send(
+                {"type": "http.response.start", "status": 200, "headers": headers}
+            )
+            await send(_PREFLIGHT_BODY)
+            return
+
+        async def send_with_cors(message: Message):
+            if message["type"] == "http.response.start":
+                # Credentials are allowed, so echo the origin rather than "*".
+                headers = list(message.get("headers", []))
+                headers.append((b"access-control-allow-origin", origin))
+                headers.append((b"access-control-allow-credentials", b"true"))
+                headers.append((b"vary", b"Origin"))
+                message["headers"] = headers
+            await send(message)
+
+        await self.app(scope, receive, send_with_cors)
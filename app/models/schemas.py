@@ -2,14 +2,18 @@
 Pydantic schemas for the Salon AI Voice Agent.
 """
 
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import Optional
-from datetime import datetime
+
+# Schemas are immutable records: freeze them and ignore unknown keys.
+_RECORD_CONFIG = ConfigDict(frozen=True, extra="ignore")
 
 
 class AppointmentRequest(BaseModel):
     """Request to book an appointment."""
 
+    model_config = _RECORD_CONFIG
+
     service: str = Field(..., description="Salon service requested")
     stylist: Optional[str] = Field(None, description="Preferred stylist")
     date: str = Field(..., description="Requested date (YYYY-MM-DD)")
@@ -22,6 +26,8 @@ class AppointmentRequest(BaseModel):
 class AppointmentResponse(BaseModel):
     """Response after booking an appointment."""
 
+    model_config = _RECORD_CONFIG
+
     event_id: str = Field(..., description="Google Calendar event ID")
     service: str
     stylist: str
@@ -35,6 +41,8 @@ class AppointmentResponse(BaseModel):
 class AvailableSlot(BaseModel):
     """An available time slot."""
 
+    model_config = _RECORD_CONFIG
+
     date: str
     start_time: str
     end_time: str
@@ -44,6 +52,8 @@ class AvailableSlot(BaseModel):
 class RAGQuery(BaseModel):
     """Query to the knowledge base."""
 
+    model_config = _RECORD_CONFIG
+
     question: str = Field(..., description="Question to search the knowledge base for")
     top_k: int = Field(default=3, description="Number of results to retrieve")
 
@@ -51,36 +61,19 @@ class RAGQuery(BaseModel):
 class RAGResult(BaseModel):
     """Result from the knowledge base."""
 
+    model_config = _RECORD_CONFIG
+
     content: str = Field(..., description="Retrieved content")
     source: str = Field(..., description="Source section of the knowledge base")
     relevance_score: float = Field(..., description="Similarity score")
 
 
-class CallSession(BaseModel):
-    """Tracks state for an active phone call."""
-
-    call_sid: str = Field(..., description="Twilio Call SID")
-    customer_phone: Optional[str] = Field(None, description="Caller phone number")
-    customer_name: Optional[str] = Field(None, description="Extracted customer name")
-    conversation_history: list[dict] = Field(
-        default_factory=list, description="List of message dicts for the LLM"
-    )
-    extracted_info: dict = Field(
-        default_factory=dict, description="Info extracted so far from conversation"
-    )
-    intent: Optional[str] = Field(
-        None, description="Detected intent: book, reschedule, cancel, inquiry"
-    )
-    started_at: datetime = Field(
-        default_factory=datetime.utcnow, description="Call start time"
-    )
-    is_active: bool = Field(default=True, description="Whether the call is still active")
-
-
 class InteractionLog(BaseModel):
     """A single logged interaction."""
 
-    timestamp: str
+    model_config = _RECORD_CONFIG
+
+    timestamp: int = Field(..., description="Unix epoch time in nanoseconds")
     call_sid: str
     direction: str = "inbound"
     customer_phone: Optional[str] = None
@@ -0,0 +1,52 @@
+"""
+Per-call session state for the Salon AI Voice Agent.
+
+Kept as a plain slotted dataclass rather than a Pydantic model: it is
+internal state mutated on every turn, not a validated API payload.
+"""
+
+import time
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Iterable, Optional
+
+# Messages kept verbatim per call; older ones are folded into the summary.
+MAX_HISTORY_MESSAGES = 20
+SUMMARY_MAX_CHARS = 1500
+
+
+@dataclass(slots=True)
+class CallSession:
+    """Tracks state for an active phone call."""
+
+    call_sid: str  # Twilio Call SID
+    customer_phone: Optional[str] = None  # Caller phone number
+    customer_name: Optional[str] = None  # Extracted customer name
+    # Most recent message dicts for the LLM (bounded ring buffer)
+    conversation_history: deque = field(
+        default_factory=lambda: deque(maxlen=MAX_HISTORY_MESSAGES)
+    )
+    summary: Optional[str] = None  # Rolling summary of messages evicted from history
+    # Info extracted so far from conversation
+    extracted_info: dict = field(default_factory=dict)
+    intent: Optional[str] = None  # Detected intent: book, reschedule, cancel, inquiry
+    started_at: int = field(default_factory=time.time_ns)  # Call start (Unix epoch ns)
+    last_activity: float = field(default_factory=time.monotonic)  # Last turn (monotonic s)
+    is_active: bool = True  # Whether the call is still active
+
+    def add_messages(self, messages: Iterable[dict]):
+        """Append messages to the history, summarizing any that fall off the end."""
+        history = self.conversation_history
+        for message in messages:
+            if len(history) == history.maxlen:
+                self._fold_into_summary(history[0])
+            history.append(message)
+
+    def _fold_into_summary(self, message: dict):
+        """Keep a trimmed transcript line for a message leaving the history."""
+        content = message.get("content")
+        if not content:
+            return
+        line = f"{message.get('role', 'unknown')}: {content}"
+        summary = f"{self.summary}\n{line}" if self.summary else line
+        self.summary = summary[-SUMMARY_MAX_CHARS:]
@@ -5,11 +5,17 @@ Contains the system prompt that shapes the agent's personality and behavior,
 and the tool schemas exposed to the LLM for function calling.
 """
 
+from functools import lru_cache
+from types import MappingProxyType
+
+import orjson
+
 from app.config import get_settings
 
 
+@lru_cache(maxsize=1)
 def get_system_prompt() -> str:
-    """Build the system prompt for the salon receptionist agent."""
+    """Build (once) the system prompt for the salon receptionist agent."""
     settings = get_settings()
     salon_name = settings.salon_name
 
@@ -70,7 +76,7 @@ pricing, stylists, and policies.
 
 # ── Tool Definitions for OpenRouter / LLM ─────────────────────
 
-TOOL_DEFINITIONS = [
+TOOL_DEFINITIONS = (
     {
         "type": "function",
         "function": {
@@ -248,4 +254,28 @@ TOOL_DEFINITIONS = [
             },
         },
     },
-]
+)
+
+
+
+def _freeze(obj):
+    """Recursively convert dicts to read-only mappings and lists to tuples."""
+    if isinstance(obj, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in obj.items()})
+    if isinstance(obj, (list, tuple)):
+        return tuple(_freeze(x) for x in obj)
+    return obj
+
+
+# Read-only, so no consumer can change the schema after it is serialized.
+TOOL_DEFINITIONS = _freeze(TOOL_DEFINITIONS)
+
+# Serialized once at import – the tool schema never changes at runtime.
+# orjson has no native support for read-only mappings; default=dict
+# serializes each one as the dict it wraps.
+TOOL_DEFINITIONS_JSON = orjson.dumps(TOOL_DEFINITIONS, default=dict)
+
+
+def get_tools_payload() -> bytes:
+    """Return the pre-serialized JSON array of tool definitions."""
+    return TOOL_DEFINITIONS_JSON
@@ -5,19 +5,238 @@ Handles incoming calls via Twilio and manages real-time audio
 streaming through Twilio Media Streams.
 """
 
-import json
-import base64
-import logging
 import asyncio
-import audioop
+import queue
+import threading
+import warnings
+from concurrent.futures import Executor, ThreadPoolExecutor
+from functools import lru_cache
+from typing import Callable, Iterator, Optional
+
+import numpy as np
+import orjson
+import picologging as logging
+import pybase64
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect, Request
 from fastapi.responses import Response
 
 from app.services.call_orchestrator import call_orchestrator
+from app.services.voice_service import (
+    IncrementalTranscript,
+    base64_chunks,
+    voice_service,
+)
+
+# C fast path for the energy check. Removed from the stdlib in Python 3.13,
+# where the audioop-lts backport provides it; the use here is deliberate, so
+# the stdlib's deprecation warning is silenced.
+with warnings.catch_warnings():
+    warnings.simplefilter("ignore", DeprecationWarning)
+    try:
+        import audioop
+    except ImportError:
+        audioop = None
 
 logger = logging.getLogger(__name__)
 router = APIRouter(prefix="/voice", tags=["voice"])
 
+# Audio accumulation settings
+# Twilio sends 20ms chunks of μ-law 8kHz mono audio (160 bytes each)
+CHUNK_THRESHOLD = 3200   # ~0.4s of audio minimum before processing
+SILENCE_THRESHOLD = 30   # Consecutive silent chunks to detect pause (~600ms)
+PHRASE_PAUSE = 10        # Silent chunks that end a phrase mid-utterance (~200ms)
+SPEECH_RMS_THRESHOLD = 200  # RMS threshold for 16-bit PCM (after μ-law decode)
+UTTERANCE_BUFFER_BYTES = 320_000  # 20s of audio; grown if an utterance runs longer
+
+
+def _ulaw_to_linear(byte: int) -> int:
+    """Decode one G.711 μ-law byte to a signed 16-bit PCM sample."""
+    u = ~byte & 0xFF
+    t = (((u & 0x0F) << 3) + 0x84) << ((u & 0x70) >> 4)
+    return 0x84 - t if u & 0x80 else t - 0x84
+
+
+# Squared PCM amplitude for every μ-law byte, built once at import so the
+# energy check is a table lookup with no per-sample decode arithmetic.
+_ULAW_SQUARED = np.array([_ulaw_to_linear(b) ** 2 for b in range(256)], dtype=np.int64)
+# audioop.rms() truncates to an int, so "rms > T" means "mean square >= (T+1)²".
+_SPEECH_ENERGY_PER_SAMPLE = (SPEECH_RMS_THRESHOLD + 1) ** 2
+
+
+def _is_speech(chunk: bytes) -> bool:
+    """Whether a μ-law frame's RMS energy is above the speech threshold."""
+    if audioop is not None:
+        # For 160-byte Twilio frames audioop's two C calls beat NumPy's
+        # per-call overhead, so prefer it while the stdlib still has it.
+        return audioop.rms(audioop.ulaw2lin(chunk, 2), 2) > SPEECH_RMS_THRESHOLD
+    # Compare the sum of squares against the scaled squared threshold: an
+    # integer compare with no mean or sqrt, and take() is about twice as
+    # fast as fancy indexing on a frame this small.
+    energy = _ULAW_SQUARED.take(np.frombuffer(chunk, dtype=np.uint8)).sum()
+    return energy >= _SPEECH_ENERGY_PER_SAMPLE * len(chunk)
+
+
+# Digital silence is a constant μ-law byte (0xFF, or 0x7F with the other
+# polarity). Twilio frames are 160 bytes, so an all-silent frame always has
+# the same base64 payload: map those payloads straight to their raw frames
+# and skip the decode and energy check.
+_SILENCE_FRAMES = {
+    pybase64.b64encode_as_string(frame): frame
+    for frame in (b"\xff" * 160, b"\x7f" * 160)
+}
+
+
+class _BufferPool:
+    """
+    Free list of preallocated utterance buffers.
+
+    Buffers are fixed-capacity; the detector tracks how much of one is
+    filled, and a finished utterance is handed to the STT pipeline as a
+    memoryview over the filled part rather than copied. The buffer comes
+    back here once the pipeline is done with it. Buffers are taken on
+    detector threads and returned on the event loop; list pop/append are
+    atomic, so no lock is needed.
+    """
+
+    def __init__(self, max_size: int = 32):
+        self._free: list[bytearray] = []
+        self._max_size = max_size
+
+    def acquire(self) -> bytearray:
+        try:
+            return self._free.pop()
+        except IndexError:
+            return bytearray(UTTERANCE_BUFFER_BYTES)
+
+    def release(self, data: bytearray | memoryview):
+        """Return a buffer, or a view handed out over one, to the pool."""
+        if isinstance(data, memoryview):
+            buffer = data.obj
+            data.release()
+        else:
+            buffer = data
+        if len(self._free) < self._max_size:
+            self._free.append(buffer)
+
+
+_BUFFER_POOL = _BufferPool()
+
+_RESET = object()  # Detector control message: drop any partial utterance
+
+
+class _SpeechDetector:
+    """
+    Per-call utterance segmentation on a dedicated thread.
+
+    The WebSocket handler only enqueues raw base64 payloads; decoding,
+    energy detection and buffering happen here, off the event loop. When a
+    pause follows enough speech, the finished utterance is passed to
+    ``on_utterance`` from this thread.
+
+    With ``new_transcript``, each phrase ended by a short pause is handed
+    to an :class:`IncrementalTranscript` straight away, so STT runs while
+    the caller is still talking. ``on_utterance`` then receives only the
+    audio after the last phrase (empty if it was silence) together with
+    the transcript; without it, the whole utterance and None.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        on_utterance: Callable[[memoryview, Optional[IncrementalTranscript]], None],
+        new_transcript: Optional[Callable[[], IncrementalTranscript]] = None,
+    ):
+        self._frames: queue.SimpleQueue = queue.SimpleQueue()
+        self._on_utterance = on_utterance
+        self._new_transcript = new_transcript
+        self._thread = threading.Thread(
+            target=self._run, name=f"vad-{name}", daemon=True
+        )
+        self._thread.start()
+
+    def feed(self, payload: str):
+        """Queue one base64 media payload for detection."""
+        self._frames.put(payload)
+
+    def reset(self):
+        """Discard the utterance in progress, in order with queued frames."""
+        self._frames.put(_RESET)
+
+    def close(self):
+        """Stop the detector thread once queued frames are handled."""
+        self._frames.put(None)
+
+    def _run(self):
+        audio_buffer = _BUFFER_POOL.acquire()
+        buf_len = 0
+        silence_count = 0
+        is_speaking = False
+        transcript = self._new_transcript() if self._new_transcript else None
+        phrase_start = 0  # Start of the audio not yet handed to the transcript
+        phrase_has_speech = False
+
+        while (item := self._frames.get()) is not None:
+            if item is _RESET:
+                buf_len = 0
+                is_speaking = False
+                silence_count = 0
+                phrase_start = 0
+                phrase_has_speech = False
+                if transcript is not None:
+                    transcript.reset()
+                continue
+
+            chunk = _SILENCE_FRAMES.get(item)
+            if chunk is not None:
+                speech = False
+            else:
+                chunk = pybase64.b64decode(item)
+                speech = _is_speech(chunk)
+
+            end = buf_len + len(chunk)
+            if end > len(audio_buffer):
+                audio_buffer.extend(bytes(len(audio_buffer)))  # Double capacity
+            audio_buffer[buf_len:end] = chunk
+            buf_len = end
+
+            if speech:
+                is_speaking = True
+                phrase_has_speech = True
+                silence_count = 0
+            elif is_speaking:
+                silence_count += 1
+
+            # Start transcribing a phrase as soon as the caller draws breath
+            if (
+                transcript is not None
+                and phrase_has_speech
+                and silence_count == PHRASE_PAUSE
+                and buf_len - phrase_start > CHUNK_THRESHOLD
+            ):
+                transcript.add(bytes(audio_buffer[phrase_start:buf_len]))
+                phrase_start = buf_len
+                phrase_has_speech = False
+
+            # Hand off the utterance when we detect a pause after speech
+            if (
+                is_speaking
+                and silence_count >= SILENCE_THRESHOLD
+                and buf_len > CHUNK_THRESHOLD
+            ):
+                tail_start = phrase_start if phrase_has_speech else buf_len
+                self._on_utterance(
+                    memoryview(audio_buffer)[tail_start:buf_len], transcript
+                )
+                audio_buffer = _BUFFER_POOL.acquire()
+                buf_len = 0
+                is_speaking = False
+                silence_count = 0
+                transcript = self._new_transcript() if self._new_transcript else None
+                phrase_start = 0
+                phrase_has_speech = False
+
+        _BUFFER_POOL.release(audio_buffer)
+
 
 @router.post("/incoming")
 async def handle_incoming_call(request: Request):
@@ -60,25 +279,69 @@ async def websocket_media_stream(websocket: WebSocket):
     await websocket.accept()
     logger.info("WebSocket connection established")
 
+    loop = asyncio.get_running_loop()
     call_sid = None
     caller = None
     stream_sid = None
-    audio_buffer = bytearray()
     greeting_sent = False
+    detector = None
+    pipeline_task = None
+    # Per-call worker thread for the blocking pipeline, so a slow call can
+    # never starve others of the shared default pool; it also keeps each
+    # call's turns strictly ordered.
+    call_executor: Optional[ThreadPoolExecutor] = None
 
-    # Audio accumulation settings
-    # Twilio sends 20ms chunks of μ-law 8kHz mono audio (160 bytes each)
-    CHUNK_THRESHOLD = 3200   # ~0.4s of audio minimum before processing
-    SILENCE_THRESHOLD = 30   # Consecutive silent chunks to detect pause (~600ms)
-    SPEECH_RMS_THRESHOLD = 200  # RMS threshold for 16-bit PCM (after μ-law decode)
-
-    silence_count = 0
-    is_speaking = False
     is_processing = False  # Guard against re-entrant processing
 
+    async def respond(
+        audio_data: memoryview, transcript: Optional[IncrementalTranscript]
+    ):
+        """Run one utterance through the pipeline and play the reply."""
+        nonlocal is_processing
+
+        logger.info(f"Processing {len(audio_data)} bytes of audio from {call_sid}")
+
+        # The BLOCKING STT → LLM → TTS steps run off the event loop so the
+        # WebSocket stays alive and responsive; each sentence's audio is
+        # streamed to Twilio while the LLM is still generating the next.
+        try:
+            sent = False
+            if stream_sid:
+                sent = await _stream_audio(
+                    websocket,
+                    stream_sid,
+                    base64_chunks(
+                        call_orchestrator.converse(call_sid, audio_data, transcript)
+                    ),
+                    call_executor,
+                )
+            _BUFFER_POOL.release(audio_data)
+
+            if not sent:
+                is_processing = False  # No audio to play
+            # Otherwise keep is_processing=True until the mark event
+            # confirms Twilio has finished playing the audio.
+            # The mark handler below resets it.
+        except Exception as e:
+            logger.error(f"Pipeline error: {e}")
+            is_processing = False  # Reset immediately on error
+
+    def on_utterance(
+        audio_data: memoryview, transcript: Optional[IncrementalTranscript]
+    ):
+        """Start the pipeline for an utterance cut by the detector."""
+        nonlocal is_processing, pipeline_task
+        if is_processing:
+            # Frames already in flight when the last utterance was cut
+            _BUFFER_POOL.release(audio_data)
+            return
+        is_processing = True
+        pipeline_task = asyncio.create_task(respond(audio_data, transcript))
+
     try:
+        # Twilio sends text frames, so iter_bytes() is not an option here
         async for message in websocket.iter_text():
-            data = json.loads(message)
+            data = orjson.loads(message)
             event_type = data.get("event")
 
             if event_type == "start":
@@ -94,10 +357,22 @@ async def websocket_media_stream(websocket: WebSocket):
                     f"Call: {call_sid} | Caller: {caller}"
                 )
 
+                detector = _SpeechDetector(
+                    call_sid,
+                    lambda audio, transcript: loop.call_soon_threadsafe(
+                        on_utterance, audio, transcript
+                    ),
+                    voice_service.incremental_transcript,
+                )
+
+                call_executor = ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix=f"call-{call_sid}"
+                )
+
                 # Initialize call session and send greeting
                 # Run in thread to avoid blocking the event loop
-                greeting_audio_b64 = await asyncio.to_thread(
-                    call_orchestrator.start_call, call_sid, caller
+                greeting_audio_b64 = await loop.run_in_executor(
+                    call_executor, call_orchestrator.start_call, call_sid, caller
                 )
 
                 if greeting_audio_b64 and stream_sid:
@@ -107,67 +382,12 @@ async def websocket_media_stream(websocket: WebSocket):
 
             elif event_type == "media":
                 # Skip audio accumulation while processing a response
-                if is_processing:
+                if is_processing or detector is None:
                     continue
 
                 payload = data.get("media", {}).get("payload", "")
                 if payload:
-                    chunk = base64.b64decode(payload)
-                    audio_buffer.extend(chunk)
-
-                    # Proper μ-law energy detection
-                    try:
-                        linear_chunk = audioop.ulaw2lin(chunk, 2)
-                        rms_energy = audioop.rms(linear_chunk, 2)
-                    except Exception:
-                        rms_energy = 0
-
-                    if rms_energy > SPEECH_RMS_THRESHOLD:
-                        is_speaking = True
-                        silence_count = 0
-                    elif is_speaking:
-                        silence_count += 1
-
-                    # Process when we detect a pause after speech
-                    if (
-                        is_speaking
-                        and silence_count >= SILENCE_THRESHOLD
-                        and len(audio_buffer) > CHUNK_THRESHOLD
-                    ):
-                        audio_data = bytes(audio_buffer)
-                        audio_buffer.clear()
-                        is_speaking = False
-                        silence_count = 0
-                        is_processing = True
-
-                        logger.info(
-                            f"Processing {len(audio_data)} bytes of audio "
-                            f"from {call_sid}"
-                        )
-
-                        # Run the BLOCKING STT → LLM → TTS pipeline in a
-                        # thread so the WebSocket stays alive and responsive
-                        try:
-                            agent_text, response_audio_b64 = (
-                                await asyncio.to_thread(
-                                    call_orchestrator.process_customer_audio,
-                                    call_sid,
-                                    audio_data,
-                                )
-                            )
-
-                            if response_audio_b64 and stream_sid:
-                                await _send_audio(
-                                    websocket, stream_sid, response_audio_b64
-                                )
-                                # Keep is_processing=True until the mark event
-                                # confirms Twilio has finished playing the audio.
-                                # The mark handler below resets it.
-                            else:
-                                is_processing = False  # No audio to play
-                        except Exception as e:
-                            logger.error(f"Pipeline error: {e}")
-                            is_processing = False  # Reset immediately on error
+                    detector.feed(payload)
 
             elif event_type == "stop":
                 logger.info(f"Stream stopped: {stream_sid}")
@@ -177,14 +397,13 @@ async def websocket_media_stream(websocket: WebSocket):
 
             elif event_type == "mark":
                 mark_name = data.get("mark", {}).get("name")
-                logger.debug(f"Mark received: {mark_name}")
+                logger.debug("Mark received: %s", mark_name)
                 if mark_name == "response_end":
                     # Twilio has finished playing the agent's audio response.
                     # Now it's safe to start listening for the caller's reply.
                     is_processing = False
-                    audio_buffer.clear()
-                    is_speaking = False
-                    silence_count = 0
+                    if detector is not None:
+                        detector.reset()
 
     except WebSocketDisconnect:
         logger.info(f"WebSocket disconnected: {call_sid}")
@@ -194,33 +413,87 @@ async def websocket_media_stream(websocket: WebSocket):
         logger.error(f"WebSocket error: {e}")
         if call_sid:
             call_orchestrator.end_call(call_sid)
+    finally:
+        if detector is not None:
+            detector.close()
+        if pipeline_task is not None and not pipeline_task.done():
+            pipeline_task.cancel()
+        if call_executor is not None:
+            call_executor.shutdown(wait=False, cancel_futures=True)
+
+
+@lru_cache(maxsize=1024)
+def _frame_templates(stream_sid: str) -> tuple[str, str]:
+    """
+    Return the media frame prefix and the full mark frame for a stream.
+
+    Only the payload varies between frames of a stream, so these are built
+    once per call and reused by every reply. Base64 needs no JSON escaping;
+    the stream SID is escaped here.
+    """
+    sid_json = orjson.dumps(stream_sid).decode()
+    media_head = '{"event":"media","streamSid":' + sid_json + ',"media":{"payload":"'
+    mark_frame = (
+        '{"event":"mark","streamSid":' + sid_json + ',"mark":{"name":"response_end"}}'
+    )
+    return media_head, mark_frame
 
 
 async def _send_audio(websocket: WebSocket, stream_sid: str, audio_b64: str):
     """
     Send audio back to Twilio via the WebSocket Media Stream.
+
+    The chunk size is a multiple of 3 bytes, so each chunk is exactly a
+    4-character-aligned slice of the base64 string and never needs to be
+    decoded and re-encoded. Frames stay text: Twilio rejects binary ones.
     """
-    CHUNK_SIZE = 8000  # ~1 second of μ-law 8kHz audio
+    # ~4 seconds of μ-law 8kHz audio per frame (a multiple of 3). Twilio
+    # buffers outbound audio and has no per-frame duration requirement, so
+    # fewer, larger frames mean fewer sends per reply.
+    CHUNK_SIZE = 31998
+    B64_CHUNK_SIZE = CHUNK_SIZE // 3 * 4
+
+    media_head, mark_frame = _frame_templates(stream_sid)
+    for i in range(0, len(audio_b64), B64_CHUNK_SIZE):
+        await websocket.send_text(
+            media_head + audio_b64[i : i + B64_CHUNK_SIZE] + '"}}'
+        )
 
-    audio_bytes = base64.b64decode(audio_b64)
-    for i in range(0, len(audio_bytes), CHUNK_SIZE):
-        chunk = audio_bytes[i : i + CHUNK_SIZE]
-        chunk_b64 = base64.b64encode(chunk).decode("utf-8")
+    # Mark event to track when audio finishes playing
+    await websocket.send_text(mark_frame)
 
-        media_message = {
-            "event": "media",
-            "streamSid": stream_sid,
-            "media": {"payload": chunk_b64},
-        }
-        await websocket.send_text(json.dumps(media_message))
 
-    # Mark event to track when audio finishes playing
-    mark_message = {
-        "event": "mark",
-        "streamSid": stream_sid,
-        "mark": {"name": "response_end"},
-    }
-    await websocket.send_text(json.dumps(mark_message))
+async def _stream_audio(
+    websocket: WebSocket,
+    stream_sid: str,
+    payloads: Iterator[str],
+    executor: Optional[Executor] = None,
+) -> bool:
+    """
+    Forward base64 μ-law payloads from a blocking TTS stream to Twilio.
+
+    Each payload is pulled on ``executor`` (the default pool if None), so
+    synthesis and encoding both stay off the event loop, and sent as its
+    own media frame: playback starts after the first chunk instead of
+    after the whole reply. A mark follows the last frame.
+
+    Returns:
+        Whether any audio was sent.
+    """
+    loop = asyncio.get_running_loop()
+    media_head, mark_frame = _frame_templates(stream_sid)
+    sent = False
+    while True:
+        payload = await loop.run_in_executor(executor, next, payloads, None)
+        if payload is None:
+            break
+        await websocket.send_text(media_head + payload + '"}}')
+        sent = True
+
+    if sent:
+        # Mark event to track when audio finishes playing
+        await websocket.send_text(mark_frame)
+    return sent
 
 
 # ── REST endpoint for text-based testing ──────────────
@@ -230,18 +503,26 @@ async def text_chat(request: Request):
     """
     REST endpoint for testing the agent without voice.
     Send JSON: {"call_sid": "test-123", "message": "I'd like to book a haircut"}
+    Add "audio": true to also get the reply as base64 Opus in "agent_audio".
     """
     body = await request.json()
     call_sid = body.get("call_sid", "test-session")
     message = body.get("message", "")
+    with_audio = bool(body.get("audio", False))
 
     if not message:
         return {"error": "No message provided"}
 
-    agent_response, _ = call_orchestrator.process_customer_text(call_sid, message)
+    # The LLM round trip and any tool calls block, so keep them off the loop
+    agent_response, agent_audio = await asyncio.to_thread(
+        call_orchestrator.process_customer_text, call_sid, message, with_audio
+    )
 
-    return {
+    response = {
         "call_sid": call_sid,
         "agent_response": agent_response,
     }
+    if with_audio:
+        response["agent_audio"] = agent_audio
+    return response
 
@@ -5,11 +5,15 @@ Handles checking availability, creating, updating, and deleting
 appointments using a Google Service Account.
 """
 
-import logging
+import asyncio
+import json
+import sys
 from datetime import datetime, timedelta
+from functools import lru_cache
 from zoneinfo import ZoneInfo
 from typing import Optional
 
+import picologging as logging
 from google.oauth2 import service_account
 from googleapiclient.discovery import build
 
@@ -19,6 +23,24 @@ logger = logging.getLogger(__name__)
 
 SCOPES = ["https://www.googleapis.com/auth/calendar"]
 
+if sys.version_info >= (3, 11):
+    # fromisoformat() accepts a trailing "Z" natively since Python 3.11
+    _parse_iso = datetime.fromisoformat
+else:
+
+    def _parse_iso(value: str) -> datetime:
+        """Parse an ISO-8601 timestamp, accepting a trailing "Z"."""
+        if value.endswith("Z"):
+            value = value[:-1] + "+00:00"
+        return datetime.fromisoformat(value)
+
+
+@lru_cache(maxsize=4)
+def _load_service_account_info(path: str) -> dict:
+    """Read and parse a service account key file once per process."""
+    with open(path, "rb") as f:
+        return json.load(f)
+
 
 class CalendarService:
     """Google Calendar integration for appointment management."""
@@ -26,15 +48,31 @@ class CalendarService:
     def __init__(self):
         self._service = None
         self._settings = None
+        # Per-call constants, resolved once from settings on first use
+        self._cal_id: Optional[str] = None
+        self._tz_name: Optional[str] = None
+        self._tz_info: Optional[ZoneInfo] = None
 
     def initialize(self):
         """Authenticate and build the Google Calendar service client."""
         self._settings = get_settings()
+        self._load_settings()
         try:
-            credentials = service_account.Credentials.from_service_account_file(
-                self._settings.google_service_account_file, scopes=SCOPES
+            # Build from the cached key info, so a re-initialization (e.g. a
+            # lazy retry from a call after a failed startup) skips the disk.
+            credentials = service_account.Credentials.from_service_account_info(
+                _load_service_account_info(self._settings.google_service_account_file),
+                scopes=SCOPES,
+            )
+            # Use the discovery document bundled with the client library:
+            # no network fetch and no discovery cache file on disk.
+            self._service = build(
+                "calendar",
+                "v3",
+                credentials=credentials,
+                cache_discovery=False,
+                static_discovery=True,
             )
-            self._service = build("calendar", "v3", credentials=credentials)
             logger.info("Google Calendar service initialized.")
         except Exception as e:
             logger.error(f"Failed to initialize Google Calendar: {e}")
@@ -46,17 +84,31 @@ class CalendarService:
             self.initialize()
         return self._service
 
-    def _calendar_id(self) -> str:
-        """Return the configured calendar ID."""
+    def _load_settings(self):
+        """Cache the calendar ID and salon timezone from settings."""
         if self._settings is None:
             self._settings = get_settings()
-        return self._settings.google_calendar_id
+        self._cal_id = self._settings.google_calendar_id
+        self._tz_name = self._settings.salon_timezone
+        self._tz_info = ZoneInfo(self._tz_name)
+
+    def _calendar_id(self) -> str:
+        """Return the configured calendar ID."""
+        if self._cal_id is None:
+            self._load_settings()
+        return self._cal_id
 
     def _timezone(self) -> str:
         """Return the configured salon timezone."""
-        if self._settings is None:
-            self._settings = get_settings()
-        return self._settings.salon_timezone
+        if self._tz_name is None:
+            self._load_settings()
+        return self._tz_name
+
+    def _tzinfo(self) -> ZoneInfo:
+        """Return the salon timezone as a ZoneInfo."""
+        if self._tz_info is None:
+            self._load_settings()
+        return self._tz_info
 
     def get_available_slots(
         self,
@@ -76,78 +128,78 @@ class CalendarService:
             List of dicts with 'start_time' and 'end_time' strings.
         """
         service = self._get_service()
-        tz = self._timezone()
 
         # Define business hours (9 AM to 7 PM) in the salon's timezone
-        tz_info = ZoneInfo(tz)
+        tz_info = self._tzinfo()
         day_start = datetime.fromisoformat(f"{date}T09:00:00").replace(tzinfo=tz_info)
         day_end = datetime.fromisoformat(f"{date}T19:00:00").replace(tzinfo=tz_info)
 
-        # Query existing events for the day
-        time_min = day_start.isoformat()
-        time_max = day_end.isoformat()
+        # Query existing events for the day. The stylist filter runs
+        # server-side (free-text search over summary and description), and
+        # only the start/end fields are returned.
+        query = {
+            "calendarId": self._calendar_id(),
+            "timeMin": day_start.isoformat(),
+            "timeMax": day_end.isoformat(),
+            "singleEvents": True,
+            "orderBy": "startTime",
+            "fields": "items(start,end)",
+        }
+        if stylist:
+            query["q"] = stylist
 
         try:
-            events_result = (
-                service.events()
-                .list(
-                    calendarId=self._calendar_id(),
-                    timeMin=time_min,
-                    timeMax=time_max,
-                    singleEvents=True,
-                    orderBy="startTime",
-                )
-                .execute()
-            )
+            events_result = service.events().list(**query).execute()
             events = events_result.get("items", [])
         except Exception as e:
             logger.error(f"Error fetching calendar events: {e}")
             return []
 
-        # Filter by stylist if specified
-        if stylist:
-            events = [
-                e
-                for e in events
-                if stylist.lower() in e.get("description", "").lower()
-                or stylist.lower() in e.get("summary", "").lower()
-            ]
-
-        # Build list of busy periods, normalized to salon timezone
+        # Build list of busy periods. Aware datetimes compare correctly
+        # across UTC offsets, so they are left in whatever zone the API used.
         busy_periods = []
         for event in events:
-            start = event["start"].get("dateTime", event["start"].get("date"))
-            end = event["end"].get("dateTime", event["end"].get("date"))
-            bs = datetime.fromisoformat(start.replace("Z", "+00:00")).astimezone(tz_info)
-            be = datetime.fromisoformat(end.replace("Z", "+00:00")).astimezone(tz_info)
-            busy_periods.append((bs, be))
+            start = event["start"].get("dateTime")
+            if start is None:
+                # All-day event (date only) – it covers the whole business day
+                busy_periods.append((day_start, day_end))
+                continue
+            busy_periods.append(
+                (_parse_iso(start), _parse_iso(event["end"]["dateTime"]))
+            )
+
+        # The API orders events by start time; sort anyway so the sweep
+        # below never depends on it (the list is tiny).
+        busy_periods.sort()
 
-        # Find available slots
+        # Find available slots in one sweep: busy periods that end before
+        # the candidate slot are passed over for good, so each period is
+        # looked at a bounded number of times.
         available_slots = []
         current = day_start
         duration = timedelta(minutes=duration_minutes)
+        step = timedelta(minutes=30)  # 30-min intervals
+        bi = 0
 
         while current + duration <= day_end:
             slot_end = current + duration
-            # Check if this slot conflicts with any busy period
-            is_free = True
-            for busy_start, busy_end in busy_periods:
-                if current < busy_end and slot_end > busy_start:
-                    is_free = False
-                    # Jump to end of this busy period
-                    current = busy_end
-                    break
-
-            if is_free:
-                available_slots.append(
-                    {
-                        "start_time": current.strftime("%H:%M"),
-                        "end_time": slot_end.strftime("%H:%M"),
-                        "date": date,
-                    }
-                )
-                current += timedelta(minutes=30)  # 30-min intervals
-            # If not free, current was already advanced above
+            while bi < len(busy_periods) and busy_periods[bi][1] <= current:
+                bi += 1
+
+            if bi < len(busy_periods) and busy_periods[bi][0] < slot_end:
+                # Conflict – jump to the end of this busy period, back in
+                # the salon's timezone so slot times are reported locally
+                current = busy_periods[bi][1].astimezone(tz_info)
+                continue
+
+            available_slots.append(
+                {
+                    "start_time": current.strftime("%H:%M"),
+                    "end_time": slot_end.strftime("%H:%M"),
+                    "date": date,
+                }
+            )
+            current += step
 
         return available_slots
 
@@ -274,6 +326,7 @@ class CalendarService:
                     singleEvents=True,
                     orderBy="startTime",
                     maxResults=50,
+                    fields="items(id,start,end,summary,description)",
                 )
                 .execute()
             )
@@ -338,12 +391,8 @@ class CalendarService:
                 start_dt = datetime.fromisoformat(f"{new_date}T{new_start_time}:00")
                 # Calculate duration from old event if not provided
                 if new_duration_minutes is None:
-                    old_start = datetime.fromisoformat(
-                        event["start"]["dateTime"].replace("Z", "+00:00")
-                    )
-                    old_end = datetime.fromisoformat(
-                        event["end"]["dateTime"].replace("Z", "+00:00")
-                    )
+                    old_start = _parse_iso(event["start"]["dateTime"])
+                    old_end = _parse_iso(event["end"]["dateTime"])
                     new_duration_minutes = int(
                         (old_end - old_start).total_seconds() / 60
                     )
@@ -411,6 +460,30 @@ class CalendarService:
             logger.error(f"Error cancelling appointment: {e}")
             raise
 
+    # ── Async variants ────────────────────────────────
+    # The Google client is blocking; these run the calls above in a worker
+    # thread so async callers (e.g. route handlers) never stall the loop.
+
+    async def aget_available_slots(self, *args, **kwargs) -> list[dict]:
+        """Async variant of :meth:`get_available_slots`."""
+        return await asyncio.to_thread(self.get_available_slots, *args, **kwargs)
+
+    async def acreate_appointment(self, *args, **kwargs) -> dict:
+        """Async variant of :meth:`create_appointment`."""
+        return await asyncio.to_thread(self.create_appointment, *args, **kwargs)
+
+    async def afind_appointment(self, *args, **kwargs) -> list[dict]:
+        """Async variant of :meth:`find_appointment`."""
+        return await asyncio.to_thread(self.find_appointment, *args, **kwargs)
+
+    async def aupdate_appointment(self, *args, **kwargs) -> dict:
+        """Async variant of :meth:`update_appointment`."""
+        return await asyncio.to_thread(self.update_appointment, *args, **kwargs)
+
+    async def adelete_appointment(self, *args, **kwargs) -> dict:
+        """Async variant of :meth:`delete_appointment`."""
+        return await asyncio.to_thread(self.delete_appointment, *args, **kwargs)
+
 
 # Singleton instance
 calendar_service = CalendarService()
@@ -5,24 +5,135 @@ Ties together Voice (ElevenLabs), LLM (OpenRouter), Calendar,
 and RAG services into a coherent per-call conversation loop.
 """
 
-import logging
+import asyncio
+import queue
+import threading
 import time
-from datetime import datetime, timezone
-from typing import Optional
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator, Optional
 
-from app.models.schemas import CallSession
+import picologging as logging
+
+from app.models.session import CallSession
 from app.services.llm_agent import llm_agent
-from app.services.voice_service import voice_service
+from app.services.semantic_cache import semantic_cache
+from app.services.voice_service import (
+    PREBUFFER_MS,
+    IncrementalTranscript,
+    voice_service,
+)
 from app.logger.interaction_logger import interaction_logger
 
 logger = logging.getLogger(__name__)
 
+# Sessions are normally freed by end_call, but Twilio does not always report
+# a hangup. The store is capped, and sessions idle this long are reaped.
+MAX_SESSIONS = 1000
+SESSION_IDLE_TIMEOUT_SECONDS = 600
+REAP_INTERVAL_SECONDS = 60
+
+# Intent implied by each tool; the last mapped tool called in a turn wins.
+# Values are string literals, so every session shares the interned objects.
+_INTENT_BY_TOOL = {
+    "check_availability": "book",
+    "book_appointment": "book",
+    "reschedule_appointment": "reschedule",
+    "cancel_appointment": "cancel",
+    "search_knowledge_base": "inquiry",
+}
+
+
+def _update_intent(session: CallSession, tools_called: list[str]):
+    """Record the intent implied by this turn's tool calls, if any."""
+    for tool_name in reversed(tools_called):
+        intent = _INTENT_BY_TOOL.get(tool_name)
+        if intent is not None:
+            session.intent = intent
+            return
+
+
+# Short acknowledgement played while a tool runs, so the caller does not sit
+# through the silence of a calendar or knowledge-base lookup.
+_TOOL_ACKS = {
+    "check_availability": "Let me check the schedule for you.",
+    "book_appointment": "One moment while I book that for you.",
+    "reschedule_appointment": "One moment while I move that for you.",
+    "cancel_appointment": "One moment while I cancel that for you.",
+    "lookup_appointment": "Let me pull up your appointment.",
+    "search_knowledge_base": "Let me look that up for you.",
+}
+_DEFAULT_TOOL_ACK = "One moment, please."
+
+
+# Sentences are synthesized here, so the next one can be synthesizing while
+# the current one is still being sent.
+_TTS_EXECUTOR = ThreadPoolExecutor(max_workers=32, thread_name_prefix="tts")
+
 
 class CallOrchestrator:
     """Manages the lifecycle of an inbound phone call."""
 
     def __init__(self):
-        self._active_sessions: dict[str, CallSession] = {}
+        # LRU order: least recently active session first
+        self._active_sessions: OrderedDict[str, CallSession] = OrderedDict()
+        # Sessions are touched from per-call worker threads and the event loop
+        self._sessions_lock = threading.Lock()
+
+    def _add_session(self, session: CallSession):
+        """Store a session, ending the least recently active ones if over the cap."""
+        with self._sessions_lock:
+            self._active_sessions[session.call_sid] = session
+            self._active_sessions.move_to_end(session.call_sid)
+            evicted = []
+            while len(self._active_sessions) > MAX_SESSIONS:
+                evicted.append(self._active_sessions.popitem(last=False)[1])
+        for old in evicted:
+            logger.warning(f"Session store full, evicting call {old.call_sid}")
+            self._close_session(old)
+
+    def _touch_session(self, call_sid: str) -> Optional[CallSession]:
+        """Get a session and mark it as the most recently active."""
+        with self._sessions_lock:
+            session = self._active_sessions.get(call_sid)
+            if session is not None:
+                self._active_sessions.move_to_end(call_sid)
+                session.last_activity = time.monotonic()
+            return session
+
+    def reap_idle_sessions(self) -> int:
+        """
+        End every session idle for longer than the timeout.
+
+        Returns:
+            Number of sessions reaped.
+        """
+        cutoff = time.monotonic() - SESSION_IDLE_TIMEOUT_SECONDS
+        idle = []
+        with self._sessions_lock:
+            # LRU order, so the idle sessions are all at the front
+            for call_sid, session in self._active_sessions.items():
+                if session.last_activity > cutoff:
+                    break
+                idle.append(call_sid)
+            idle = [self._active_sessions.pop(call_sid) for call_sid in idle]
+        for session in idle:
+            logger.warning(f"Reaping idle session for call {session.call_sid}")
+            self._close_session(session)
+        return len(idle)
+
+    async def run_reaper(self):
+        """Periodically reap idle sessions; runs until cancelled."""
+        while True:
+            await asyncio.sleep(REAP_INTERVAL_SECONDS)
+            self.reap_idle_sessions()
+
+    def warmup(self):
+        """Pre-synthesize the greeting and tool acks so no call waits for them."""
+        voice_service.prewarm(
+            [llm_agent.get_greeting(), *_TOOL_ACKS.values(), _DEFAULT_TOOL_ACK]
+        )
+        logger.info("Greeting and tool acknowledgement audio cached.")
 
     def start_call(self, call_sid: str, customer_phone: Optional[str] = None) -> str:
         """
@@ -36,12 +147,8 @@ class CallOrchestrator:
             Base64-encoded greeting audio.
         """
         # Create session
-        session = CallSession(
-            call_sid=call_sid,
-            customer_phone=customer_phone,
-            started_at=datetime.now(timezone.utc),
-        )
-        self._active_sessions[call_sid] = session
+        session = CallSession(call_sid=call_sid, customer_phone=customer_phone)
+        self._add_session(session)
 
         # Log call start
         interaction_logger.log_call_start(call_sid, customer_phone)
@@ -52,117 +159,297 @@ class CallOrchestrator:
 
         # Convert greeting to speech
         try:
-            greeting_audio_b64 = voice_service.text_to_speech_base64(greeting_text)
+            greeting_audio_b64 = voice_service.text_to_speech_base64(
+                greeting_text, cache=True
+            )
         except Exception as e:
             logger.error(f"TTS error for greeting: {e}")
             greeting_audio_b64 = ""
 
         # Store greeting in conversation history
-        session.conversation_history.append(
-            {"role": "assistant", "content": greeting_text}
-        )
+        session.add_messages([{"role": "assistant", "content": greeting_text}])
 
         return greeting_audio_b64
 
-    def process_customer_audio(
-        self, call_sid: str, audio_bytes: bytes
-    ) -> tuple[str, str]:
+    def reply_to_audio(
+        self,
+        call_sid: str,
+        audio_bytes: bytes | memoryview,
+        on_sentence: Optional[Callable[[str], None]] = None,
+        on_tool_call: Optional[Callable[[str], None]] = None,
+        transcript: Optional[IncrementalTranscript] = None,
+    ) -> str:
         """
-        Process incoming customer audio: STT → LLM → TTS.
+        Run the STT → LLM half of a turn and return the text to speak.
+
+        Callers that can play audio incrementally pair this with
+        :meth:`speak` instead of waiting for the whole reply to synthesize.
 
         Args:
             call_sid: Twilio Call SID.
             audio_bytes: Raw audio bytes from the customer.
+            on_sentence: If given, the LLM reply is streamed and each
+                sentence is passed here as it completes. Apologies for
+                STT/LLM failures are only returned, never passed here.
+            on_tool_call: Passed through to :meth:`LLMAgent.chat`.
+            transcript: Phrases of the utterance already sent to STT while
+                the caller spoke; ``audio_bytes`` is then only the audio
+                after the last of them.
 
         Returns:
-            Tuple of (agent_response_text, base64_audio_response).
+            The agent's reply (or an apology on failure), or "" if there is
+            nothing to say.
         """
-        session = self._active_sessions.get(call_sid)
+        session = self._touch_session(call_sid)
         if session is None:
             logger.warning(f"No active session for call {call_sid}")
-            return "", ""
+            return ""
 
-        start_time = time.time()
+        start_time = time.perf_counter()
 
         # ── Step 1: Speech-to-Text ─────────────────────
         try:
-            customer_text = voice_service.speech_to_text(audio_bytes)
+            if transcript is not None:
+                customer_text = transcript.finish(audio_bytes)
+            else:
+                customer_text = voice_service.speech_to_text(audio_bytes)
         except Exception as e:
             logger.error(f"STT error: {e}")
             interaction_logger.log_error(call_sid, str(e), "stt")
-            error_response = "I'm sorry, I didn't catch that. Could you say that again?"
-            error_audio = voice_service.text_to_speech_base64(error_response)
-            return error_response, error_audio
+            return "I'm sorry, I didn't catch that. Could you say that again?"
 
         if not customer_text or customer_text.strip() == "":
-            return "", ""
+            return ""
 
         logger.info(f"Customer ({call_sid}): {customer_text}")
 
         # ── Step 2: LLM Processing ────────────────────
         try:
+            history = list(session.conversation_history)
             agent_response, updated_history, tools_called = llm_agent.chat(
-                conversation_history=session.conversation_history,
+                conversation_history=history,
                 user_message=customer_text,
                 call_sid=call_sid,
+                summary=session.summary,
+                extracted_info=session.extracted_info,
+                on_sentence=on_sentence,
+                on_tool_call=on_tool_call,
             )
-            session.conversation_history = updated_history
+            session.add_messages(updated_history[len(history):])
+            _update_intent(session, tools_called)
         except Exception as e:
             logger.error(f"LLM error: {e}")
             interaction_logger.log_error(call_sid, str(e), "llm")
-            error_response = (
+            return (
                 "I apologize, I'm experiencing a brief issue. "
                 "Could you repeat what you said?"
             )
-            error_audio = voice_service.text_to_speech_base64(error_response)
-            return error_response, error_audio
 
         logger.info(f"Agent ({call_sid}): {agent_response}")
 
-        # ── Step 3: Text-to-Speech ────────────────────
+        elapsed = time.perf_counter() - start_time
+        logger.info(f"Reply generated in {elapsed:.2f}s | Tools: {tools_called}")
+
+        return agent_response
+
+    def converse(
+        self,
+        call_sid: str,
+        audio_bytes: bytes | memoryview,
+        transcript: Optional[IncrementalTranscript] = None,
+    ) -> Iterator[bytes]:
+        """
+        Run a whole turn and yield reply audio sentence by sentence.
+
+        STT and the streamed LLM call run on a helper thread that queues
+        each sentence as soon as it is complete, so synthesis of the first
+        sentence overlaps generation of the rest, and the next sentence is
+        synthesized while the current one is still being sent. If the model
+        reaches for a tool before saying anything, a pre-synthesized
+        acknowledgement is played while the tool runs.
+
+        Args:
+            call_sid: Twilio Call SID.
+            audio_bytes: Raw audio bytes from the customer.
+            transcript: Passed through to :meth:`reply_to_audio`.
+
+        Yields:
+            Raw μ-law 8kHz audio chunks.
+        """
+        # (text, is_ack) pairs, then None once the turn is over
+        sentences: queue.SimpleQueue[Optional[tuple[str, bool]]] = queue.SimpleQueue()
+
+        def produce():
+            streamed = False
+            acked = False
+
+            def on_sentence(sentence: str):
+                nonlocal streamed
+                streamed = True
+                sentences.put((sentence, False))
+
+            def on_tool_call(tool_name: str):
+                nonlocal acked
+                if not streamed and not acked:
+                    acked = True
+                    sentences.put((_TOOL_ACKS.get(tool_name, _DEFAULT_TOOL_ACK), True))
+
+            try:
+                reply = self.reply_to_audio(
+                    call_sid, audio_bytes, on_sentence, on_tool_call, transcript
+                )
+                if reply and not streamed:
+                    # Nothing was streamed, e.g. an apology after an error
+                    sentences.put((reply, False))
+            finally:
+                sentences.put(None)
+
+        threading.Thread(
+            target=produce, name=f"reply-{call_sid}", daemon=True
+        ).start()
+
+        def start(item: tuple[str, bool], first: bool) -> Iterator[bytes]:
+            text, is_ack = item
+            if is_ack:
+                return self._speak_ack(call_sid, text)
+            # Only the opening audio needs a prebuffer; anything after it
+            # is synthesized while earlier audio is still playing.
+            return self._synthesize_ahead(call_sid, text, prebuffer=first)
+
+        if (item := sentences.get()) is None:
+            return
+        playing = start(item, first=True)
+        upcoming: Optional[Iterator[bytes]] = None
+        finished = False
+        while True:
+            for chunk in playing:
+                yield chunk
+                # Start synthesizing the next sentence as soon as it exists,
+                # rather than after this one has been sent
+                if upcoming is None and not finished:
+                    try:
+                        item = sentences.get_nowait()
+                    except queue.Empty:
+                        continue
+                    if item is None:
+                        finished = True
+                    else:
+                        upcoming = start(item, first=False)
+            if upcoming is not None:
+                playing, upcoming = upcoming, None
+            elif finished or (item := sentences.get()) is None:
+                return
+            else:
+                playing = start(item, first=False)
+
+    def _synthesize_ahead(
+        self, call_sid: str, text: str, prebuffer: bool
+    ) -> Iterator[bytes]:
+        """Start speaking text in the background; iterate to get its audio."""
+        chunks: queue.SimpleQueue[Optional[bytes]] = queue.SimpleQueue()
+
+        def run():
+            try:
+                for chunk in self.speak(call_sid, text, prebuffer):
+                    chunks.put(chunk)
+            finally:
+                chunks.put(None)
+
+        _TTS_EXECUTOR.submit(run)
+        return iter(chunks.get, None)
+
+    def _speak_ack(self, call_sid: str, ack_text: str) -> Iterator[bytes]:
+        """Yield the cached audio for a tool acknowledgement, if available."""
         try:
-            response_audio_b64 = voice_service.text_to_speech_base64(agent_response)
+            yield voice_service.text_to_speech(ack_text, cache=True)
         except Exception as e:
-            logger.error(f"TTS error: {e}")
-            interaction_logger.log_error(call_sid, str(e), "tts")
-            response_audio_b64 = ""
+            # An ack is optional; the real reply follows regardless
+            logger.error(f"TTS error for tool acknowledgement: {e}")
+            interaction_logger.log_error(call_sid, str(e), "tts_ack")
 
-        elapsed = time.time() - start_time
-        logger.info(f"Turn processed in {elapsed:.2f}s | Tools: {tools_called}")
+    def speak(
+        self, call_sid: str, text: str, prebuffer: bool = True
+    ) -> Iterator[bytes]:
+        """
+        Synthesize text and yield μ-law audio chunks as they arrive.
 
-        return agent_response, response_audio_b64
+        A TTS failure is logged and ends the stream early rather than
+        raising, so the caller simply stops sending audio. Sentences of
+        semantically cached replies are synthesized once, then replayed.
 
-    def process_customer_text(self, call_sid: str, text: str) -> tuple[str, str]:
+        Args:
+            call_sid: Twilio Call SID (for error logging).
+            text: Text to speak.
+            prebuffer: Hold back the start of the audio briefly so playback
+                is not choppy; see :meth:`VoiceService.text_to_speech_stream`.
+
+        Yields:
+            Raw μ-law 8kHz audio chunks.
+        """
+        cached_audio = semantic_cache.audio_for(text) or voice_service.cached_speech(text)
+        if cached_audio is not None:
+            yield cached_audio
+            return
+
+        keep = semantic_cache.wants_audio(text)
+        chunks = []
+        try:
+            prebuffer_ms = PREBUFFER_MS if prebuffer else 0
+            for chunk in voice_service.text_to_speech_stream(
+                text, prebuffer_ms=prebuffer_ms
+            ):
+                if keep:
+                    chunks.append(chunk)
+                yield chunk
+            if keep:
+                semantic_cache.store_audio(text, b"".join(chunks))
+        except Exception as e:
+            logger.error(f"TTS error: {e}")
+            interaction_logger.log_error(call_sid, str(e), "tts")
+
+    def process_customer_text(
+        self, call_sid: str, text: str, with_audio: bool = False
+    ) -> tuple[str, str]:
         """
         Process a text input directly (useful for testing without voice).
 
         Args:
             call_sid: Call or session identifier.
             text: Customer's text message.
+            with_audio: Also synthesize the reply, as Opus for browser
+                playback. Off by default so text-only callers skip TTS.
 
         Returns:
-            Tuple of (agent_response_text, base64_audio_response).
+            Tuple of (agent_response_text, base64_audio_response); the
+            audio is empty unless requested.
         """
-        session = self._active_sessions.get(call_sid)
+        session = self._touch_session(call_sid)
         if session is None:
             # Create a temporary session
-            session = CallSession(
-                call_sid=call_sid,
-                started_at=datetime.now(timezone.utc),
-            )
-            self._active_sessions[call_sid] = session
+            session = CallSession(call_sid=call_sid)
+            self._add_session(session)
 
         # LLM processing
+        history = list(session.conversation_history)
         agent_response, updated_history, tools_called = llm_agent.chat(
-            conversation_history=session.conversation_history,
+            conversation_history=history,
             user_message=text,
             call_sid=call_sid,
+            summary=session.summary,
+            extracted_info=session.extracted_info,
         )
-        session.conversation_history = updated_history
+        session.add_messages(updated_history[len(history):])
+        _update_intent(session, tools_called)
+
+        if not with_audio:
+            return agent_response, ""
 
         # TTS
         try:
-            response_audio_b64 = voice_service.text_to_speech_base64(agent_response)
+            # Text sessions are not phone calls, so use the compact web codec
+            response_audio_b64 = voice_service.text_to_speech_base64(
+                agent_response, channel="web"
+            )
         except Exception:
             response_audio_b64 = ""
 
@@ -175,12 +462,17 @@ class CallOrchestrator:
         Args:
             call_sid: Twilio Call SID.
         """
-        session = self._active_sessions.pop(call_sid, None)
+        with self._sessions_lock:
+            session = self._active_sessions.pop(call_sid, None)
         if session:
+            self._close_session(session)
+
+    def _close_session(self, session: CallSession):
+        """Mark a session removed from the store as ended and log it."""
+        call_sid = session.call_sid
+        if session.is_active:
             session.is_active = False
-            duration = (
-                datetime.now(timezone.utc) - session.started_at
-            ).total_seconds()
+            duration = (time.time_ns() - session.started_at) / 1e9
             interaction_logger.log_call_end(
                 call_sid=call_sid,
                 duration_seconds=duration,
@@ -0,0 +1,25 @@
+"""
+Shared HTTP client for outbound API calls.
+
+OpenRouter and ElevenLabs are called on every turn of every call. Routing
+both SDKs through one pooled client keeps TLS connections warm between
+requests, and with HTTP/2 concurrent calls multiplex over a single
+connection per host instead of each opening their own.
+"""
+
+import httpx
+
+try:
+    import h2  # noqa: F401 – httpx only speaks HTTP/2 when this is installed
+except ImportError:
+    h2 = None
+
+shared_client = httpx.Client(
+    http2=h2 is not None,
+    # Turns are seconds apart; httpx's 5 s default expiry would drop the idle
+    # connection between them and pay a fresh TLS handshake every turn.
+    limits=httpx.Limits(
+        max_keepalive_connections=50, max_connections=200, keepalive_expiry=120.0
+    ),
+    timeout=httpx.Timeout(30.0, connect=5.0),
+)
@@ -5,22 +5,153 @@ Connects to OpenRouter (OpenAI-compatible API) for conversation
 and dispatches tool calls to the appropriate services.
 """
 
-import json
-import logging
+import re
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
-from typing import Optional
+from typing import Callable, Optional
 from zoneinfo import ZoneInfo
 
-from openai import OpenAI
+import orjson
+import picologging as logging
+from openai import OpenAI, Stream
+from openai.types.chat import (
+    ChatCompletion,
+    ChatCompletionChunk,
+    ChatCompletionMessage,
+    ChatCompletionMessageToolCall,
+)
 
 from app.config import get_settings
-from app.prompts.salon_agent import get_system_prompt, TOOL_DEFINITIONS
+from app.prompts.salon_agent import get_system_prompt, get_tools_payload
 from app.services.rag_service import rag_service
+from app.services.http_client import shared_client
 from app.services.calendar_service import calendar_service
+from app.services.semantic_cache import is_shareable, semantic_cache
 from app.logger.interaction_logger import interaction_logger
 
 logger = logging.getLogger(__name__)
 
+# Tool arguments remembered on the call session across turns. Service and
+# stylist names come from a small fixed set, so they are interned to share
+# one string object per value across all concurrent sessions.
+_EXTRACTED_FIELDS = ("service", "stylist", "customer_name", "customer_phone")
+_INTERNED_FIELDS = frozenset({"service", "stylist"})
+
+# History sent to the model is capped by (estimated) tokens, not messages:
+# the opening messages are always kept and the oldest of the rest dropped.
+HISTORY_TOKEN_BUDGET = 3000
+HISTORY_KEEP_HEAD = 2
+# Rough English average for GPT-style tokenizers, plus per-message framing.
+_CHARS_PER_TOKEN = 4
+_TOKENS_PER_MESSAGE = 4
+
+
+def _estimate_tokens(message: dict) -> int:
+    """Approximate the prompt tokens a history message costs."""
+    content = message.get("content")
+    length = len(content) if isinstance(content, str) else 0
+    return length // _CHARS_PER_TOKEN + _TOKENS_PER_MESSAGE
+
+
+def _trim_history(history: list[dict]) -> list[dict]:
+    """Drop messages from the middle of the history until it fits the budget."""
+    costs = [_estimate_tokens(message) for message in history]
+    total = sum(costs)
+    if total <= HISTORY_TOKEN_BUDGET:
+        return history
+
+    # The latest message always stays, even if it alone is over budget
+    start = HISTORY_KEEP_HEAD
+    while total > HISTORY_TOKEN_BUDGET and start < len(history) - 1:
+        total -= costs[start]
+        start += 1
+    return history[:HISTORY_KEEP_HEAD] + history[start:]
+
+
+def _dumps(obj) -> str:
+    """Serialize a tool result for the model."""
+    return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS).decode()
+
+
+# Tool results that never vary are serialized once.
+_NO_SLOTS_RESULT = _dumps({
+    "status": "no_slots",
+    "message": "No available slots found for the requested date and criteria.",
+})
+_NOT_FOUND_RESULT = _dumps({
+    "status": "not_found",
+    "message": "No upcoming appointment found with that information.",
+})
+
+# The tool schema is spliced into every request body already serialized.
+_TOOLS_FRAGMENT = orjson.Fragment(get_tools_payload())
+
+# Shared pool for running a round's tool calls concurrently.
+_TOOL_EXECUTOR = ThreadPoolExecutor(max_workers=8, thread_name_prefix="llm-tool")
+
+# Sentence-ending punctuation followed by whitespace; streamed replies are
+# handed to TTS one sentence at a time at these boundaries.
+_SENTENCE_END = re.compile(r"[.!?]+(?=\s)")
+# A period after these is not a sentence end ("Dr. Lee", "at 9 a.m. on")
+_ABBREVIATIONS = ("Dr.", "Mr.", "Mrs.", "Ms.", "St.", "a.m.", "p.m.", "e.g.", "i.e.")
+# Shorter fragments ("Sure!") are merged into the next sentence, since each
+# TTS request carries a fixed overhead and very short clips sound clipped.
+MIN_SENTENCE_CHARS = 10
+
+
+# The opening chunk of a reply goes to TTS at the first natural pause – a
+# clause break once it has a few words, or any word break once it is long –
+# so the caller hears something before the whole first sentence is in.
+_CLAUSE_END = re.compile(r"[,;:](?=\s)")
+_WORD_BREAK = re.compile(r"\s")
+FIRST_CHUNK_MIN_WORDS = 3
+FIRST_CHUNK_MAX_CHARS = 40
+
+
+def _split_first_chunk(text: str) -> tuple[Optional[str], str]:
+    """Split off the opening chunk of a reply if an early break is available."""
+    for match in _CLAUSE_END.finditer(text):
+        chunk = text[:match.end()].strip()
+        if len(chunk.split()) >= FIRST_CHUNK_MIN_WORDS:
+            return chunk, text[match.end():]
+    if len(text) > FIRST_CHUNK_MAX_CHARS:
+        match = _WORD_BREAK.search(text, FIRST_CHUNK_MAX_CHARS)
+        if match is not None:
+            return text[:match.start()].strip(), text[match.start():]
+    return None, text
+
+
+def _split_sentences(text: str) -> tuple[list[str], str]:
+    """Split off the complete sentences of ``text``; return them and the rest."""
+    sentences = []
+    start = 0
+    for match in _SENTENCE_END.finditer(text):
+        sentence = text[start:match.end()].strip()
+        if len(sentence) < MIN_SENTENCE_CHARS or sentence.endswith(_ABBREVIATIONS):
+            continue
+        sentences.append(sentence)
+        start = match.end()
+    return sentences, text[start:]
+
+
+def _reply_sentences(text: str) -> list[str]:
+    """Every piece a finished reply is spoken in, the unterminated tail last."""
+    sentences, rest = _split_sentences(text)
+    if rest.strip():
+        sentences.append(rest.strip())
+    return sentences
+
+
+def _remember_tool_args(extracted_info: dict, arguments: dict):
+    """Copy known customer details from tool arguments into extracted_info."""
+    for key in _EXTRACTED_FIELDS:
+        value = arguments.get(key)
+        if not value or not isinstance(value, str):
+            continue
+        extracted_info[key] = sys.intern(value) if key in _INTERNED_FIELDS else value
+
 
 class LLMAgent:
     """LLM-powered conversational agent via OpenRouter."""
@@ -29,6 +160,14 @@ class LLMAgent:
         self._client: Optional[OpenAI] = None
         self._model: Optional[str] = None
         self._settings = None
+        self._system_message: Optional[dict] = None
+        self._system_fragment: Optional[orjson.Fragment] = None
+        self._salon_tz: Optional[ZoneInfo] = None
+        self._greeting: Optional[str] = None
+        # Caps in-flight OpenRouter requests; excess turns queue here
+        # instead of piling onto the provider and drawing 429s.
+        self._slots: Optional[threading.BoundedSemaphore] = None
+        self._slots_lock = threading.Lock()
 
     def initialize(self):
         """Set up the OpenAI client pointed at OpenRouter."""
@@ -36,8 +175,14 @@ class LLMAgent:
         self._client = OpenAI(
             base_url="https://openrouter.ai/api/v1",
             api_key=self._settings.openrouter_api_key,
+            http_client=shared_client,
         )
         self._model = self._settings.openrouter_model
+        self._system_message = None
+        self._system_fragment = None
+        self._salon_tz = ZoneInfo(self._settings.salon_timezone)
+        self._greeting = None
+        self._slots = None
         logger.info(f"LLM Agent initialized with model: {self._model}")
 
     def _get_client(self) -> OpenAI:
@@ -46,17 +191,162 @@ class LLMAgent:
             self.initialize()
         return self._client
 
-    def _build_system_message(self) -> dict:
-        """Build the system message with current date context."""
-        prompt = get_system_prompt()
-        salon_tz = ZoneInfo(self._settings.salon_timezone if self._settings else "America/Los_Angeles")
-        now = datetime.now(salon_tz)
-        date_context = (
-            f"\n\n## Current Date & Time\n"
-            f"Today is {now.strftime('%A, %B %d, %Y')}. "
-            f"Current time: {now.strftime('%I:%M %p')}."
+    def _concurrency_slots(self) -> threading.BoundedSemaphore:
+        """The request slots, sized from OPENROUTER_MAX_CONCURRENCY on first use."""
+        if self._slots is None:
+            with self._slots_lock:
+                if self._slots is None:
+                    self._slots = threading.BoundedSemaphore(
+                        get_settings().openrouter_max_concurrency
+                    )
+        return self._slots
+
+    def _uses_cache_control(self) -> bool:
+        """Whether the model needs explicit prompt-cache breakpoints."""
+        return bool(self._model) and self._model.startswith("anthropic/")
+
+    def _static_system_message(self) -> dict:
+        """
+        The system prompt message, built once and reused on every request.
+
+        It holds nothing that changes between turns, so together with the
+        tool definitions it forms a byte-identical prefix that providers
+        can serve from their prompt cache.
+        """
+        if self._system_message is None:
+            prompt = get_system_prompt()
+            if self._uses_cache_control():
+                content = [
+                    {
+                        "type": "text",
+                        "text": prompt,
+                        "cache_control": {"type": "ephemeral"},
+                    }
+                ]
+                self._system_message = {"role": "system", "content": content}
+            else:
+                self._system_message = {"role": "system", "content": prompt}
+            self._system_fragment = orjson.Fragment(orjson.dumps(self._system_message))
+        return self._system_message
+
+    def _request(self, client: OpenAI, messages: list[dict], stream: bool = False):
+        """
+        POST a chat completion whose static parts are already serialized.
+
+        The system prompt and tool schema are the bulk of every request and
+        never change, so they are spliced in as pre-encoded JSON and only the
+        conversation is serialized per call. ``messages[0]`` must be the
+        static system message.
+        """
+        body = orjson.dumps(
+            {
+                "model": self._model,
+                "messages": [self._system_fragment, *messages[1:]],
+                "tools": _TOOLS_FRAGMENT,
+                "tool_choice": "auto",
+                "temperature": 0.7,
+                "max_tokens": 500,
+                "stream": stream,
+            }
+        )
+        return client.post(
+            "/chat/completions",
+            content=body,
+            cast_to=ChatCompletion,
+            stream=stream,
+            stream_cls=Stream[ChatCompletionChunk],
+        )
+
+    def _dynamic_context_message(self) -> dict:
+        """Build the current date & time context for this turn."""
+        if self._salon_tz is None:
+            self._salon_tz = ZoneInfo(
+                self._settings.salon_timezone if self._settings else "America/Los_Angeles"
+            )
+        now = datetime.now(self._salon_tz)
+        return {
+            "role": "system",
+            "content": (
+                f"## Current Date & Time\n"
+                f"Today is {now.strftime('%A, %B %d, %Y')}. "
+                f"Current time: {now.strftime('%I:%M %p')}."
+            ),
+        }
+
+    def _stream_reply(
+        self,
+        client: OpenAI,
+        messages: list[dict],
+        on_sentence: Callable[[str], None],
+        on_tool_call: Optional[Callable[[str], None]] = None,
+    ) -> ChatCompletionMessage:
+        """
+        Stream one completion, passing each finished sentence to ``on_sentence``.
+
+        The opening chunk may end at a clause break rather than a full
+        sentence, so speech starts sooner. Sentences are flushed only until
+        the first tool-call delta arrives; after that the round is a tool
+        round and its text is not spoken. ``on_tool_call`` gets the first
+        tool's name as soon as it streams in, before its arguments are
+        complete.
+
+        Returns:
+            The assembled assistant message, shaped like a non-streamed one.
+        """
+        stream = self._request(client, messages, stream=True)
+
+        content: list[str] = []
+        pending = ""
+        spoken = False
+        tool_calls: dict[int, dict] = {}
+        for chunk in stream:
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta
+
+            for tc in delta.tool_calls or ():
+                call = tool_calls.setdefault(
+                    tc.index, {"id": "", "name": "", "arguments": ""}
+                )
+                if tc.id:
+                    call["id"] = tc.id
+                if tc.function is not None:
+                    call["name"] += tc.function.name or ""
+                    call["arguments"] += tc.function.arguments or ""
+                if on_tool_call is not None and call["name"]:
+                    on_tool_call(call["name"])
+                    on_tool_call = None
+
+            if delta.content:
+                content.append(delta.content)
+                if not tool_calls:
+                    text = pending + delta.content
+                    if not spoken:
+                        first, text = _split_first_chunk(text)
+                        if first:
+                            on_sentence(first)
+                            spoken = True
+                    sentences, pending = _split_sentences(text)
+                    for sentence in sentences:
+                        on_sentence(sentence)
+                        spoken = True
+
+        if pending.strip() and not tool_calls:
+            on_sentence(pending.strip())
+
+        return ChatCompletionMessage(
+            role="assistant",
+            content="".join(content) or None,
+            tool_calls=[
+                ChatCompletionMessageToolCall(
+                    id=call["id"],
+                    type="function",
+                    function={"name": call["name"], "arguments": call["arguments"]},
+                )
+                for _, call in sorted(tool_calls.items())
+            ]
+            or None,
         )
-        return {"role": "system", "content": prompt + date_context}
 
     def _execute_tool(self, tool_name: str, arguments: dict) -> str:
         """
@@ -79,12 +369,9 @@ class LLMAgent:
                     stylist=arguments.get("stylist"),
                 )
                 if not result:
-                    return json.dumps({
-                        "status": "no_slots",
-                        "message": "No available slots found for the requested date and criteria.",
-                    })
+                    return _NO_SLOTS_RESULT
                 # Limit to 5 slots for brevity
-                return json.dumps({
+                return _dumps({
                     "status": "available",
                     "slots": result[:5],
                     "total_available": len(result),
@@ -108,7 +395,7 @@ class LLMAgent:
                     stylist=arguments.get("stylist", ""),
                     notes=arguments.get("notes", ""),
                 )
-                return json.dumps(result)
+                return _dumps(result)
 
             elif tool_name == "reschedule_appointment":
                 result = calendar_service.update_appointment(
@@ -116,13 +403,13 @@ class LLMAgent:
                     new_date=arguments["new_date"],
                     new_start_time=arguments["new_start_time"],
                 )
-                return json.dumps(result)
+                return _dumps(result)
 
             elif tool_name == "cancel_appointment":
                 result = calendar_service.delete_appointment(
                     event_id=arguments["event_id"],
                 )
-                return json.dumps(result)
+                return _dumps(result)
 
             elif tool_name == "lookup_appointment":
                 result = calendar_service.find_appointment(
@@ -130,34 +417,35 @@ class LLMAgent:
                     customer_phone=arguments.get("customer_phone"),
                 )
                 if not result:
-                    return json.dumps({
-                        "status": "not_found",
-                        "message": "No upcoming appointment found with that information.",
-                    })
-                return json.dumps({"status": "found", "appointments": result})
+                    return _NOT_FOUND_RESULT
+                return _dumps({"status": "found", "appointments": result})
 
             elif tool_name == "search_knowledge_base":
                 results = rag_service.query(
                     question=arguments["query"],
                     top_k=3,
                 )
-                return json.dumps({
+                return _dumps({
                     "status": "success",
                     "results": results,
                 })
 
             else:
-                return json.dumps({"error": f"Unknown tool: {tool_name}"})
+                return _dumps({"error": f"Unknown tool: {tool_name}"})
 
         except Exception as e:
             logger.error(f"Tool execution error ({tool_name}): {e}")
-            return json.dumps({"error": str(e)})
+            return _dumps({"error": str(e)})
 
     def chat(
         self,
         conversation_history: list[dict],
         user_message: str,
         call_sid: str = "unknown",
+        summary: Optional[str] = None,
+        extracted_info: Optional[dict] = None,
+        on_sentence: Optional[Callable[[str], None]] = None,
+        on_tool_call: Optional[Callable[[str], None]] = None,
     ) -> tuple[str, list[dict], list[str]]:
         """
         Send a user message to the LLM and get a response,
@@ -167,21 +455,78 @@ class LLMAgent:
             conversation_history: Existing messages in the conversation.
             user_message: The latest user (customer) message from STT.
             call_sid: Twilio Call SID for logging.
+            summary: Rolling summary of earlier messages no longer in the history.
+            extracted_info: Optional dict updated with details from tool arguments.
+            on_sentence: If given, the reply is streamed and each completed
+                sentence is passed here as soon as it arrives, so speech can
+                start before generation finishes.
+            on_tool_call: If given, called with the first tool's name in each
+                tool round as soon as it is known, so the caller can fill
+                the silence while tools run.
 
         Returns:
             Tuple of (agent_response_text, updated_conversation_history, tools_called_list).
         """
         client = self._get_client()
 
-        # Trim history if too long to prevent context window overflow
-        MAX_HISTORY = 40
-        if len(conversation_history) > MAX_HISTORY:
-            # Keep first 4 messages (opening context) and last 36 (recent)
-            conversation_history = conversation_history[:4] + conversation_history[-36:]
-
-        # Build messages
-        messages = [self._build_system_message()]
-        messages.extend(conversation_history)
+        # Trim the history sent to the model to a fixed token budget. The
+        # returned history is never trimmed, so callers can append to it.
+        context_history = _trim_history(conversation_history)
+
+        # A question answered from the knowledge base before is answered
+        # the same way again, without an LLM roundtrip. It is keyed with
+        # the agent's last words, which the question may be replying to.
+        previous_reply = next(
+            (
+                m["content"]
+                for m in reversed(conversation_history)
+                if m.get("role") == "assistant" and isinstance(m.get("content"), str)
+            ),
+            "",
+        )
+        question_embedding = semantic_cache.embed(user_message, previous_reply)
+        cached_response = semantic_cache.lookup(question_embedding)
+        if cached_response is not None:
+            if on_sentence is not None:
+                for sentence in _reply_sentences(cached_response):
+                    on_sentence(sentence)
+            updated_history = conversation_history.copy()
+            updated_history.append({"role": "user", "content": user_message})
+            updated_history.append({"role": "assistant", "content": cached_response})
+            interaction_logger.log_interaction(
+                call_sid=call_sid,
+                customer_transcript=user_message,
+                agent_response=cached_response,
+                extra={"semantic_cache_hit": True},
+            )
+            return cached_response, updated_history, []
+
+        # Build messages. Everything up to the end of the history is the
+        # same as last turn's request; the time of day goes after it so it
+        # never invalidates the cached prefix.
+        messages = [self._static_system_message()]
+        if summary:
+            messages.append(
+                {
+                    "role": "system",
+                    "content": f"Summary of earlier conversation:\n{summary}",
+                }
+            )
+        messages.extend(context_history)
+        if context_history and self._uses_cache_control():
+            last = messages[-1]
+            if isinstance(last.get("content"), str):
+                messages[-1] = {
+                    **last,
+                    "content": [
+                        {
+                            "type": "text",
+                            "text": last["content"],
+                            "cache_control": {"type": "ephemeral"},
+                        }
+                    ],
+                }
+        messages.append(self._dynamic_context_message())
         messages.append({"role": "user", "content": user_message})
 
         tools_called = []
@@ -189,14 +534,16 @@ class LLMAgent:
 
         for round_num in range(max_tool_rounds):
             try:
-                response = client.chat.completions.create(
-                    model=self._model,
-                    messages=messages,
-                    tools=TOOL_DEFINITIONS,
-                    tool_choice="auto",
-                    temperature=0.7,
-                    max_tokens=500,
-                )
+                with self._concurrency_slots():
+                    if on_sentence is not None:
+                        message = self._stream_reply(
+                            client, messages, on_sentence, on_tool_call
+                        )
+                    else:
+                        response = self._request(client, messages)
+                        message = response.choices[0].message
+                        if message.tool_calls and on_tool_call is not None:
+                            on_tool_call(message.tool_calls[0].function.name)
             except Exception as e:
                 logger.error(f"OpenRouter API error: {e}")
                 interaction_logger.log_error(call_sid, str(e), "llm_chat")
@@ -207,24 +554,35 @@ class LLMAgent:
                     tools_called,
                 )
 
-            choice = response.choices[0]
-
             # If the LLM wants to call tools
-            if choice.message.tool_calls:
+            if message.tool_calls:
                 # Add the assistant message with tool calls
-                messages.append(choice.message.model_dump())
+                messages.append(message.model_dump())
 
-                for tool_call in choice.message.tool_calls:
+                calls = []
+                for tool_call in message.tool_calls:
                     fn_name = tool_call.function.name
                     try:
-                        fn_args = json.loads(tool_call.function.arguments)
-                    except json.JSONDecodeError:
+                        fn_args = orjson.loads(tool_call.function.arguments)
+                    except orjson.JSONDecodeError:
                         fn_args = {}
 
                     tools_called.append(fn_name)
-                    tool_result = self._execute_tool(fn_name, fn_args)
+                    if extracted_info is not None:
+                        _remember_tool_args(extracted_info, fn_args)
+                    calls.append((fn_name, fn_args))
+
+                # Tool calls in one round are independent network requests,
+                # so several are run concurrently rather than back to back.
+                if len(calls) == 1:
+                    tool_results = [self._execute_tool(*calls[0])]
+                else:
+                    tool_results = _TOOL_EXECUTOR.map(
+                        lambda call: self._execute_tool(*call), calls
+                    )
 
-                    # Add tool result to messages
+                # Add tool results to messages, in the order they were requested
+                for tool_call, tool_result in zip(message.tool_calls, tool_results):
                     messages.append(
                         {
                             "role": "tool",
@@ -237,7 +595,7 @@ class LLMAgent:
                 continue
 
             # No more tool calls – we have the final response
-            agent_response = choice.message.content or ""
+            agent_response = message.content or ""
 
             # Update conversation history (exclude system message)
             updated_history = conversation_history.copy()
@@ -252,6 +610,23 @@ class LLMAgent:
                 tools_called=tools_called,
             )
 
+            # Only replies grounded purely in the knowledge base are safe to
+            # reuse; anything touching the calendar depends on live state,
+            # and nothing addressed to this caller may reach another.
+            caller_messages = [
+                m["content"]
+                for m in updated_history
+                if m.get("role") == "user" and isinstance(m.get("content"), str)
+            ]
+            if (
+                tools_called
+                and all(name == "search_knowledge_base" for name in tools_called)
+                and is_shareable(agent_response, caller_messages, extracted_info)
+            ):
+                semantic_cache.store(
+                    question_embedding, agent_response, _reply_sentences(agent_response)
+                )
+
             return agent_response, updated_history, tools_called
 
         # If we exhausted tool rounds
@@ -265,11 +640,12 @@ class LLMAgent:
 
     def get_greeting(self) -> str:
         """Generate the initial greeting for an incoming call."""
-        settings = get_settings()
-        return (
-            f"Welcome to {settings.salon_name}! "
-            f"Thank you for calling. How can I help you today?"
-        )
+        if self._greeting is None:
+            self._greeting = (
+                f"Welcome to {get_settings().salon_name}! "
+                f"Thank you for calling. How can I help you today?"
+            )
+        return self._greeting
 
 
 # Singleton instance
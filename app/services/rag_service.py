@@ -1,63 +1,94 @@
 """
 RAG (Retrieval-Augmented Generation) Service.
 
-Loads the salon knowledge base, embeds documents into ChromaDB,
-and provides semantic search for customer queries.
+Loads the salon knowledge base, embeds documents into an in-memory
+matrix, and provides semantic search for customer queries.
 """
 
+import hashlib
 import json
 import os
-import logging
 from pathlib import Path
 
-import chromadb
+import numpy as np
+import picologging as logging
+
+from app.config import get_settings
 
 logger = logging.getLogger(__name__)
 
 # Path to the knowledge base JSON
 KB_PATH = Path(__file__).parent.parent.parent / "knowledge_base" / "salon_data.json"
 
+# Sentence embedding model; documents are encoded in mini-batches of this size.
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+EMBED_BATCH_SIZE = 64
 
-class RAGService:
-    """Retrieval-Augmented Generation service using ChromaDB."""
+# int8 dynamically quantized ONNX export that ships with the model; several
+# times faster on CPU than the FP32 PyTorch weights, which remain the
+# fallback when optimum/onnxruntime are not installed.
+EMBEDDING_ONNX_FILE = "onnx/model_qint8_avx512_vnni.onnx"
+ONNX_INTRA_OP_THREADS = 2
+
+# Document embeddings persist in this file under RAG_STORE_DIR between
+# process starts, tagged with a hash of the knowledge base and model so a
+# stale index is never reused.
+INDEX_FILE_NAME = "embeddings.npz"
 
-    def __init__(self):
-        self._client = None
-        self._embedding_fn = None
-        self._collection = None
+
+class RAGService:
+    """
+    Retrieval-Augmented Generation service.
+
+    The knowledge base is a few dozen documents, so search is a brute-force
+    dot product against one normalized float32 matrix – exact, and far
+    cheaper than a vector database round trip.
+    """
+
+    def __init__(self, store_dir: Path | None = None):
+        self._store_dir = store_dir  # Defaults to the RAG_STORE_DIR setting
+        self._index_path: Path | None = None
+        self._model = None
+        self._model_id = EMBEDDING_MODEL  # Tags the persisted index
+        self._matrix: np.ndarray | None = None  # (documents, dim), L2-normalized
+        self._documents: list[str] = []
+        self._metadatas: list[dict] = []
         self._raw_data = None
+        # Lowercased name -> record, for O(1) case-insensitive lookups
+        self._services_by_name: dict[str, dict] = {}
+        self._stylists_by_name: dict[str, dict] = {}
 
     def initialize(self):
         """Load knowledge base and build the vector index."""
         logger.info("Initializing RAG service...")
+        store_dir = self._store_dir or Path(get_settings().rag_store_dir)
+        self._index_path = store_dir / INDEX_FILE_NAME
 
-        # Lazy-initialize client and embeddings
-        if self._client is None:
-            self._client = chromadb.Client()
-        if self._embedding_fn is None:
-            from chromadb.utils import embedding_functions
-            self._embedding_fn = embedding_functions.SentenceTransformerEmbeddingFunction(
-                model_name="all-MiniLM-L6-v2"
-            )
+        # Lazy-initialize the embedding model
+        if self._model is None:
+            self._load_model()
 
         # Load raw salon data
-        with open(KB_PATH, "r") as f:
-            self._raw_data = json.load(f)
-
-        # Create or get the collection
-        self._collection = self._client.get_or_create_collection(
-            name="salon_knowledge",
-            embedding_function=self._embedding_fn,
-        )
+        kb_bytes = KB_PATH.read_bytes()
+        self._raw_data = json.loads(kb_bytes)
+
+        # Reversed so the first record wins on duplicate names, as a scan would
+        self._services_by_name = {
+            svc["name"].lower(): svc
+            for svc in reversed(self._raw_data.get("services", []))
+        }
+        self._stylists_by_name = {
+            stylist["name"].lower(): stylist
+            for stylist in reversed(self._raw_data.get("stylists", []))
+        }
 
         # If already populated, skip
-        if self._collection.count() > 0:
-            logger.info(f"RAG collection already has {self._collection.count()} documents.")
+        if self._matrix is not None:
+            logger.info(f"RAG index already has {len(self._documents)} documents.")
             return
 
         documents = []
         metadatas = []
-        ids = []
 
         # ── Services ───────────────────────────────────
         for i, svc in enumerate(self._raw_data.get("services", [])):
@@ -70,7 +101,6 @@ class RAGService:
             )
             documents.append(doc)
             metadatas.append({"source": "services", "service_name": svc["name"]})
-            ids.append(f"service_{i}")
 
         # ── Stylists ──────────────────────────────────
         for i, stylist in enumerate(self._raw_data.get("stylists", [])):
@@ -83,7 +113,6 @@ class RAGService:
             )
             documents.append(doc)
             metadatas.append({"source": "stylists", "stylist_name": stylist["name"]})
-            ids.append(f"stylist_{i}")
 
         # ── Policies ──────────────────────────────────
         policies = self._raw_data.get("policies", {})
@@ -91,14 +120,12 @@ class RAGService:
             doc = f"Policy – {key.replace('_', ' ').title()}: {value}"
             documents.append(doc)
             metadatas.append({"source": "policies", "policy_type": key})
-            ids.append(f"policy_{i}")
 
         # ── FAQs ──────────────────────────────────────
         for i, faq in enumerate(self._raw_data.get("faqs", [])):
             doc = f"Q: {faq['question']}\nA: {faq['answer']}"
             documents.append(doc)
             metadatas.append({"source": "faqs"})
-            ids.append(f"faq_{i}")
 
         # ── Locations ─────────────────────────────────
         for i, loc in enumerate(self._raw_data.get("locations", [])):
@@ -114,7 +141,6 @@ class RAGService:
             )
             documents.append(doc)
             metadatas.append({"source": "locations", "location_name": loc["name"]})
-            ids.append(f"location_{i}")
 
         # ── Salon Info ────────────────────────────────
         salon = self._raw_data.get("salon", {})
@@ -127,16 +153,86 @@ class RAGService:
         )
         documents.append(doc)
         metadatas.append({"source": "salon_info"})
-        ids.append("salon_info")
 
-        # Add all documents to the collection
-        self._collection.add(
-            documents=documents,
-            metadatas=metadatas,
-            ids=ids,
-        )
+        # Reuse the persisted embeddings when the knowledge base is unchanged;
+        # otherwise encode every document in one batched call
+        kb_hash = hashlib.sha256(self._model_id.encode() + kb_bytes).hexdigest()
+        matrix = self._load_index(kb_hash, len(documents))
+        if matrix is None:
+            matrix = np.ascontiguousarray(self._encode(documents), dtype=np.float32)
+            self._save_index(kb_hash, matrix)
+        self._matrix = matrix
+        self._documents = documents
+        self._metadatas = metadatas
         logger.info(f"RAG service initialized with {len(documents)} documents.")
 
+    def _load_model(self):
+        """Load the embedding model, preferring the int8 ONNX export."""
+        from sentence_transformers import SentenceTransformer
+
+        try:
+            import onnxruntime
+            import optimum.onnxruntime  # noqa: F401 – required by the ONNX backend
+        except ImportError:
+            logger.info("optimum/onnxruntime not installed, embedding with PyTorch.")
+            self._model = SentenceTransformer(EMBEDDING_MODEL)
+            self._model_id = EMBEDDING_MODEL
+            return
+
+        options = onnxruntime.SessionOptions()
+        options.intra_op_num_threads = ONNX_INTRA_OP_THREADS
+        self._model = SentenceTransformer(
+            EMBEDDING_MODEL,
+            backend="onnx",
+            model_kwargs={
+                "file_name": EMBEDDING_ONNX_FILE,
+                "provider": "CPUExecutionProvider",
+                "session_options": options,
+            },
+        )
+        self._model_id = f"{EMBEDDING_MODEL}:{EMBEDDING_ONNX_FILE}"
+
+    def _load_index(self, kb_hash: str, count: int) -> np.ndarray | None:
+        """Load persisted embeddings if they match ``kb_hash``, else None."""
+        try:
+            with np.load(self._index_path) as cached:
+                if str(cached["kb_hash"]) != kb_hash or len(cached["matrix"]) != count:
+                    logger.info("Knowledge base changed, re-embedding documents.")
+                    return None
+                matrix = np.ascontiguousarray(cached["matrix"], dtype=np.float32)
+            # Scores are plain dot products, so rows must be unit length
+            if not np.allclose(np.linalg.norm(matrix, axis=1), 1.0, atol=1e-3):
+                logger.info("Persisted RAG index is not normalized, re-embedding.")
+                return None
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.warning(f"Could not load persisted RAG index: {e}")
+            return None
+        logger.info(f"Loaded persisted RAG index from {self._index_path}.")
+        return matrix
+
+    def _save_index(self, kb_hash: str, matrix: np.ndarray):
+        """Persist embeddings atomically so a crash never leaves a torn file."""
+        # Per-process temp name: parallel test workers may all save at once
+        tmp_path = self._index_path.with_suffix(f".{os.getpid()}.tmp.npz")
+        try:
+            self._index_path.parent.mkdir(parents=True, exist_ok=True)
+            np.savez(tmp_path, matrix=matrix, kb_hash=np.array(kb_hash))
+            os.replace(tmp_path, self._index_path)
+        except Exception as e:
+            logger.warning(f"Could not persist RAG index: {e}")
+
+    def _encode(self, texts: list[str]) -> np.ndarray:
+        """Encode texts to L2-normalized float32 embeddings, in mini-batches."""
+        return self._model.encode(
+            texts,
+            batch_size=EMBED_BATCH_SIZE,
+            show_progress_bar=False,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+        )
+
     def query(self, question: str, top_k: int = 3) -> list[dict]:
         """
         Search the knowledge base for relevant information.
@@ -148,45 +244,47 @@ class RAGService:
         Returns:
             List of dicts with 'content', 'source', and 'relevance_score'.
         """
-        if self._collection is None or self._collection.count() == 0:
-            logger.warning("RAG collection is empty, initializing...")
+        if self._matrix is None:
+            logger.warning("RAG index is empty, initializing...")
             self.initialize()
 
-        results = self._collection.query(
-            query_texts=[question],
-            n_results=min(top_k, self._collection.count()),
-        )
+        # Cosine similarity, since both sides are L2-normalized
+        scores = self._matrix @ self._encode([question])[0]
+        top_k = min(top_k, len(scores))
+        top = np.argpartition(-scores, top_k - 1)[:top_k]
+        top = top[np.argsort(-scores[top])]
+
+        return [
+            {
+                "content": self._documents[i],
+                "source": self._metadatas[i].get("source", "unknown"),
+                "relevance_score": round(float(scores[i]), 4),
+            }
+            for i in top
+        ]
+
+    def embed(self, text: str):
+        """
+        Embed text with the knowledge-base model, L2-normalized.
 
-        output = []
-        for i in range(len(results["documents"][0])):
-            output.append(
-                {
-                    "content": results["documents"][0][i],
-                    "source": results["metadatas"][0][i].get("source", "unknown"),
-                    "relevance_score": round(
-                        1 - results["distances"][0][i], 4  # Convert distance to similarity
-                    ),
-                }
-            )
-        return output
+        Returns None until :meth:`initialize` has loaded the model, so
+        callers never trigger the model load on a hot path.
+        """
+        if self._model is None:
+            return None
+        return self._encode([text])[0]
 
     def get_service_by_name(self, service_name: str) -> dict | None:
         """Look up a specific service by name from raw data."""
         if self._raw_data is None:
             self.initialize()
-        for svc in self._raw_data.get("services", []):
-            if svc["name"].lower() == service_name.lower():
-                return svc
-        return None
+        return self._services_by_name.get(service_name.lower())
 
     def get_stylist_by_name(self, stylist_name: str) -> dict | None:
         """Look up a specific stylist by name from raw data."""
         if self._raw_data is None:
             self.initialize()
-        for stylist in self._raw_data.get("stylists", []):
-            if stylist["name"].lower() == stylist_name.lower():
-                return stylist
-        return None
+        return self._stylists_by_name.get(stylist_name.lower())
 
     def get_all_stylists(self) -> list[dict]:
         """Get all stylists."""
@@ -0,0 +1,220 @@
+"""
+Semantic Response Cache – reuses answers to repeated customer questions.
+
+Callers keep asking the same things ("what are your hours?", "do you do
+balayage?"). Replies that were answered purely from the knowledge base are
+cached under the embedding of the question, and a later question whose
+embedding is close enough is answered from the cache without an LLM
+roundtrip. The synthesized audio of cached replies is kept alongside, so
+those turns skip TTS as well.
+
+The key also covers the agent's previous turn, and only standalone
+questions are cached: a short follow-up like "yes" means something
+different in every conversation. The cache is shared by all calls, so
+replies that mention anything personal to the caller are never stored.
+"""
+
+import re
+import threading
+import time
+from typing import Iterable, Optional
+
+import numpy as np
+import picologging as logging
+
+from app.services.rag_service import rag_service
+
+logger = logging.getLogger(__name__)
+
+# Cosine similarity a new question needs to reuse a cached reply.
+SIMILARITY_THRESHOLD = 0.93
+
+# Cached replies expire so knowledge-base edits are picked up eventually.
+CACHE_TTL_SECONDS = 3600.0
+CACHE_MAX_ENTRIES = 256
+
+# Shorter messages are follow-ups that only make sense in their conversation.
+MIN_QUESTION_WORDS = 4
+
+# Phone numbers (seven or more digits) and calendar dates.
+_PERSONAL_PATTERN = re.compile(
+    r"(?:\d[\s().-]*){7,}"
+    r"|\b\d{1,2}/\d{1,2}\b"
+    r"|\b(?:Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec)[a-z]*\.? \d{1,2}\b"
+)
+_WORD = re.compile(r"[A-Za-z][A-Za-z'-]*")
+_PRONOUNS = frozenset({"I", "I'm", "I'd", "I'll", "I've"})
+
+
+def is_shareable(
+    reply: str, caller_messages: Iterable[str], details: Optional[dict] = None
+) -> bool:
+    """
+    Whether a reply can be replayed to other callers.
+
+    Rejects replies with phone numbers or dates, with any detail known
+    about the caller, or with a capitalized word the caller used (STT
+    capitalizes names, so this catches "Sure Maria, ..." before the
+    name was ever captured).
+    """
+    if _PERSONAL_PATTERN.search(reply):
+        return False
+    lowered = reply.lower()
+    if any(
+        isinstance(value, str) and value and value.lower() in lowered
+        for value in (details or {}).values()
+    ):
+        return False
+    reply_words = set(_WORD.findall(reply))
+    return not any(
+        word[0].isupper() and word not in _PRONOUNS and word in reply_words
+        for message in caller_messages
+        for word in _WORD.findall(message)
+    )
+
+
+class SemanticCache:
+    """In-memory cache of replies keyed by normalized question embeddings."""
+
+    def __init__(
+        self,
+        threshold: float = SIMILARITY_THRESHOLD,
+        ttl_seconds: float = CACHE_TTL_SECONDS,
+        max_entries: int = CACHE_MAX_ENTRIES,
+    ):
+        self._threshold = threshold
+        self._ttl = ttl_seconds
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        # One row per entry; ids, replies, sentences and expiry times share
+        # the row index. Ids are never reused, so audio keyed by id cannot
+        # outlive its entry.
+        self._matrix: Optional[np.ndarray] = None
+        self._ids: list[int] = []
+        self._replies: list[str] = []
+        self._sentences: list[tuple[str, ...]] = []
+        self._expires: list[float] = []
+        self._next_id = 0
+        # Sentence -> ids of the entries that speak it, and their audio
+        self._speakers: dict[str, list[int]] = {}
+        self._audio: dict[tuple[int, str], bytes] = {}
+
+    def embed(self, question: str, context: str = "") -> Optional[np.ndarray]:
+        """
+        Embed a question together with the agent turn it answers.
+
+        Returns None if the question is too short to stand on its own or
+        the model is not loaded; lookups and stores then do nothing.
+        """
+        if len(question.split()) < MIN_QUESTION_WORDS:
+            return None
+        try:
+            text = f"{context}\n{question}" if context else question
+            return rag_service.embed(text)
+        except Exception as e:
+            logger.error(f"Semantic cache embedding error: {e}")
+            return None
+
+    def lookup(self, embedding: Optional[np.ndarray]) -> Optional[str]:
+        """Return the cached reply closest to ``embedding``, if close enough."""
+        if embedding is None:
+            return None
+        with self._lock:
+            self._evict_expired()
+            if self._matrix is None:
+                return None
+            scores = self._matrix @ embedding
+            best = int(scores.argmax())
+            if scores[best] < self._threshold:
+                return None
+            return self._replies[best]
+
+    def store(
+        self,
+        embedding: Optional[np.ndarray],
+        reply: str,
+        sentences: Optional[list[str]] = None,
+    ):
+        """
+        Cache a reply under the embedding of the question it answered.
+
+        ``sentences`` are the pieces the reply is spoken in (the whole
+        reply if omitted); audio is kept per sentence.
+        """
+        if embedding is None or not reply:
+            return
+        with self._lock:
+            self._evict_expired()
+            if len(self._replies) >= self._max_entries:
+                self._drop(1)
+            row = embedding[np.newaxis, :]
+            self._matrix = row if self._matrix is None else np.vstack((self._matrix, row))
+            entry_id = self._next_id
+            self._next_id += 1
+            spoken = tuple(dict.fromkeys(sentences or [reply]))
+            self._ids.append(entry_id)
+            self._replies.append(reply)
+            self._sentences.append(spoken)
+            self._expires.append(time.monotonic() + self._ttl)
+            for sentence in spoken:
+                self._speakers.setdefault(sentence, []).append(entry_id)
+
+    def audio_for(self, text: str) -> Optional[bytes]:
+        """Previously synthesized audio for a sentence of a cached reply."""
+        with self._lock:
+            for entry_id in self._speakers.get(text, ()):
+                audio = self._audio.get((entry_id, text))
+                if audio is not None:
+                    return audio
+            return None
+
+    def wants_audio(self, text: str) -> bool:
+        """Whether text is a sentence of a cached reply whose audio is missing."""
+        with self._lock:
+            speakers = self._speakers.get(text, ())
+            return bool(speakers) and not any(
+                (entry_id, text) in self._audio for entry_id in speakers
+            )
+
+    def store_audio(self, text: str, audio: bytes):
+        """Keep the synthesized audio for a sentence of a cached reply."""
+        if not audio:
+            return
+        with self._lock:
+            speakers = self._speakers.get(text)
+            if speakers:
+                # The newest entry speaking it is the last to be evicted
+                self._audio[(speakers[-1], text)] = audio
+
+    def clear(self):
+        """Drop every cached reply and its audio."""
+        with self._lock:
+            self._drop(len(self._replies))
+
+    def _evict_expired(self):
+        """Drop entries past their TTL (oldest first; call with the lock held)."""
+        now = time.monotonic()
+        expired = 0
+        while expired < len(self._expires) and self._expires[expired] <= now:
+            expired += 1
+        if expired:
+            self._drop(expired)
+
+    def _drop(self, count: int):
+        """Drop the ``count`` oldest entries (call with the lock held)."""
+        for entry_id, spoken in zip(self._ids[:count], self._sentences[:count]):
+            for sentence in spoken:
+                self._audio.pop((entry_id, sentence), None)
+                speakers = self._speakers[sentence]
+                speakers.remove(entry_id)
+                if not speakers:
+                    del self._speakers[sentence]
+        del self._ids[:count]
+        del self._replies[:count]
+        del self._sentences[:count]
+        del self._expires[:count]
+        self._matrix = self._matrix[count:] if self._replies else None
+
+
+# Singleton instance
+semantic_cache = SemanticCache()
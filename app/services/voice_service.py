@@ -5,18 +5,222 @@ Converts text to speech (for the agent's voice) and
 speech to text (for transcribing the customer).
 """
 
-import logging
-import io
-import base64
-from typing import Optional
-
+import hashlib
+import struct
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterator, Literal, Optional
+
+import numpy as np
+import picologging as logging
+import pybase64
 from elevenlabs.client import ElevenLabs
+from elevenlabs.core.api_error import ApiError
 from elevenlabs import play  # noqa – available for local testing
 
 from app.config import get_settings
+from app.services.http_client import shared_client
 
 logger = logging.getLogger(__name__)
 
+# Low-latency ElevenLabs model used for all synthesis by default
+TTS_MODEL_ID = "eleven_turbo_v2"
+
+# Output format per consumer: Twilio plays only 8kHz μ-law, while web and
+# app clients decode Opus, several times smaller for the same quality.
+OUTPUT_FORMATS = {"twilio": "ulaw_8000", "web": "opus_48000_32"}
+Channel = Literal["twilio", "web"]
+
+# G.711 μ-law byte -> 16-bit little-endian PCM sample, decoded once at import
+_ULAW = ~np.arange(256) & 0xFF
+_ULAW_MAGNITUDE = (((_ULAW & 0x0F) << 3) + 0x84) << ((_ULAW & 0x70) >> 4)
+_ULAW_TO_PCM = np.where(
+    _ULAW & 0x80, 0x84 - _ULAW_MAGNITUDE, _ULAW_MAGNITUDE - 0x84
+).astype("<i2")
+
+# Twilio audio is 8kHz mono; the WAV header only varies in its two sizes
+_WAV_HEADER = struct.Struct("<4sI4s4sIHHIIHH4sI")
+# WAV with the μ-law format tag (7) carries Twilio's bytes as they are; a
+# non-PCM fmt chunk has a cbSize field and is followed by a fact chunk.
+_ULAW_WAV_HEADER = struct.Struct("<4sI4s4sIHHIIHHH4sII4sI")
+
+
+def _ulaw_wav(audio: bytes | memoryview) -> bytes:
+    """Wrap raw μ-law 8kHz mono audio in a μ-law WAV file, without decoding."""
+    size = len(audio)
+    header = _ULAW_WAV_HEADER.pack(
+        b"RIFF", 50 + size, b"WAVE", b"fmt ", 18, 7, 1,
+        8000, 8000, 1, 8, 0, b"fact", 4, size, b"data", size,
+    )
+    return b"".join((header, audio))
+
+
+def _ulaw_to_wav(audio: bytes | memoryview) -> bytes:
+    """Wrap raw μ-law 8kHz mono audio as a 16-bit PCM WAV file."""
+    pcm = _ULAW_TO_PCM.take(np.frombuffer(audio, dtype=np.uint8))
+    header = _WAV_HEADER.pack(
+        b"RIFF", 36 + pcm.nbytes, b"WAVE", b"fmt ", 16, 1, 1,
+        8000, 16000, 2, 16, b"data", pcm.nbytes,
+    )
+    # join() reads the array's buffer directly: one copy for the whole file
+    return b"".join((header, pcm))
+
+
+_FORMAT_ERROR_HINTS = ("format", "codec", "unsupported", "content type", "mime")
+
+
+def _rejects_format(error: ApiError) -> bool:
+    """
+    Whether an STT error says the audio format itself was refused.
+
+    A 415 always does. A 400 or 422 counts only if its body names the
+    format; otherwise it is about this clip (too short, empty) and must
+    not switch every later call to PCM.
+    """
+    if error.status_code == 415:
+        return True
+    if error.status_code not in (400, 422):
+        return False
+    body = str(error.body).lower()
+    return any(hint in body for hint in _FORMAT_ERROR_HINTS)
+
+
+# Streamed audio goes out in frames that start at 20ms of μ-law and double
+# up to 200ms: the first sound leaves immediately, and the rest of the reply
+# does not cost a WebSocket frame per network read.
+FIRST_FRAME_BYTES = 160
+MAX_FRAME_BYTES = 1600
+
+
+# Audio held back before the first frame of a reply, so a late network read
+# right after playback starts does not leave a gap in the audio.
+PREBUFFER_MS = 500
+
+
+@lru_cache(maxsize=16)
+def _bytes_per_ms(output_format: str) -> float:
+    """Audio bytes per millisecond for an ElevenLabs output format."""
+    codec, rate, *bitrate = output_format.split("_")
+    if codec in ("ulaw", "alaw"):
+        return int(rate) / 1000
+    if codec == "pcm":
+        return int(rate) * 2 / 1000
+    return int(bitrate[0]) / 8  # Compressed formats carry a bitrate in kbps
+
+
+def _progressive_chunks(
+    chunks: Iterator[bytes], first_frame_bytes: int = FIRST_FRAME_BYTES
+) -> Iterator[bytes]:
+    """Coalesce raw network reads into frames of progressively larger size."""
+    target = max(first_frame_bytes, FIRST_FRAME_BYTES)
+    pending = bytearray()
+    for chunk in chunks:
+        pending += chunk
+        if len(pending) >= target:
+            yield bytes(pending)
+            pending.clear()
+            target = min(target * 2, MAX_FRAME_BYTES)
+    if pending:
+        yield bytes(pending)
+
+
+def base64_chunks(chunks: Iterator[bytes]) -> Iterator[str]:
+    """
+    Base64-encode an audio stream chunk by chunk.
+
+    Each payload covers a multiple of 3 bytes, with the 0–2 leftover bytes
+    carried into the next one, so every payload decodes on its own and
+    the payloads concatenate to the encoding of the whole stream.
+    """
+    tail = b""
+    for chunk in chunks:
+        if tail:
+            chunk = tail + chunk
+        aligned = len(chunk) - len(chunk) % 3
+        tail = chunk[aligned:]
+        if aligned:
+            yield pybase64.b64encode_as_string(chunk[:aligned])
+    if tail:
+        yield pybase64.b64encode_as_string(tail)
+
+
+# Synthesized clips are kept in memory up to this many bytes (LRU), and on
+# disk (TTS_CACHE_DIR) so fixed phrases survive restarts.
+TTS_CACHE_MAX_BYTES = 10 * 1024 * 1024
+
+
+class _TTSCache:
+    """
+    Synthesized audio keyed by a hash of (text, voice, model, format).
+
+    TTS output is deterministic enough for fixed phrases – the greeting,
+    tool acknowledgements – that replaying a stored clip is
+    indistinguishable from synthesizing it again, minus the roundtrip.
+    """
+
+    def __init__(
+        self,
+        max_bytes: int = TTS_CACHE_MAX_BYTES,
+        directory: Optional[Path] = None,
+    ):
+        self._max_bytes = max_bytes
+        self._directory = directory
+        self._lock = threading.Lock()
+        self._clips: OrderedDict[str, bytes] = OrderedDict()  # LRU first
+        self._size = 0
+
+    @staticmethod
+    def key(text: str, voice_id: str, model_id: str, output_format: str) -> str:
+        """Stable cache key, also used as the clip's file name."""
+        return hashlib.blake2b(
+            f"{voice_id}|{model_id}|{output_format}|{text}".encode(), digest_size=16
+        ).hexdigest()
+
+    def get(self, key: str, disk: bool = True) -> Optional[bytes]:
+        """Return a stored clip from memory, falling back to disk if asked."""
+        with self._lock:
+            audio = self._clips.get(key)
+            if audio is not None:
+                self._clips.move_to_end(key)
+                return audio
+        if not disk or self._directory is None:
+            return None
+        try:
+            audio = (self._directory / key).read_bytes()
+        except OSError:
+            return None
+        self._remember(key, audio)
+        return audio
+
+    def put(self, key: str, audio: bytes):
+        """Store a clip in memory and on disk."""
+        if not audio:
+            return
+        self._remember(key, audio)
+        if self._directory is None:
+            return
+        try:
+            self._directory.mkdir(parents=True, exist_ok=True)
+            tmp_path = self._directory / f"{key}.tmp"
+            tmp_path.write_bytes(audio)
+            tmp_path.replace(self._directory / key)
+        except OSError as e:
+            logger.warning(f"Could not persist TTS clip: {e}")
+
+    def _remember(self, key: str, audio: bytes):
+        """Add a clip to the in-memory LRU, evicting down to the byte budget."""
+        with self._lock:
+            previous = self._clips.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous)
+            self._clips[key] = audio
+            self._size += len(audio)
+            while self._size > self._max_bytes and len(self._clips) > 1:
+                self._size -= len(self._clips.popitem(last=False)[1])
+
 
 class VoiceService:
     """ElevenLabs-powered voice service for TTS and STT."""
@@ -25,66 +229,132 @@ class VoiceService:
         self._client: Optional[ElevenLabs] = None
         self._settings = None
         self._voice_id: Optional[str] = None
+        # ElevenLabs plans cap concurrent requests; beyond the cap, requests
+        # wait here rather than failing with 429s.
+        self._slots = threading.BoundedSemaphore(10)
+        # Phrases of an utterance are transcribed here while the caller
+        # keeps talking; sized to the slots, so the provider cap is the
+        # only limit one call's phrases wait behind.
+        self._stt_executor = ThreadPoolExecutor(
+            max_workers=10, thread_name_prefix="stt"
+        )
+        # Memory only until initialize() knows where the disk cache lives
+        self._tts_cache = _TTSCache()
+        self._init_lock = threading.Lock()
+        self._stt_sends_ulaw = True
 
     def initialize(self):
         """Set up the ElevenLabs client."""
         self._settings = get_settings()
-        self._client = ElevenLabs(api_key=self._settings.elevenlabs_api_key)
+        self._client = ElevenLabs(
+            api_key=self._settings.elevenlabs_api_key, httpx_client=shared_client
+        )
         self._voice_id = self._settings.elevenlabs_voice_id
+        self._tts_cache = _TTSCache(directory=Path(self._settings.tts_cache_dir))
+        self._slots = threading.BoundedSemaphore(self._settings.elevenlabs_max_concurrency)
+        self._stt_executor.shutdown(wait=False)
+        self._stt_executor = ThreadPoolExecutor(
+            max_workers=self._settings.elevenlabs_max_concurrency,
+            thread_name_prefix="stt",
+        )
         logger.info("ElevenLabs voice service initialized.")
 
     def _get_client(self) -> ElevenLabs:
         """Lazy-initialize and return the ElevenLabs client."""
         if self._client is None:
-            self.initialize()
+            # Calls race here from per-call threads; build one client only
+            with self._init_lock:
+                if self._client is None:
+                    self.initialize()
         return self._client
 
     def text_to_speech(
         self,
         text: str,
         voice_id: Optional[str] = None,
-        model_id: str = "eleven_turbo_v2",
-        output_format: str = "ulaw_8000",
+        model_id: str = TTS_MODEL_ID,
+        output_format: Optional[str] = None,
+        channel: Channel = "twilio",
+        cache: bool = False,
     ) -> bytes:
         """
         Convert text to spoken audio using ElevenLabs TTS.
 
+        Waits for the whole clip; for live playback use
+        :meth:`text_to_speech_stream`.
+
         Args:
             text: The text to synthesize.
             voice_id: Override voice ID (defaults to configured voice).
             model_id: ElevenLabs model to use ('eleven_turbo_v2' for low latency).
-            output_format: Audio format. 'ulaw_8000' for Twilio compatibility.
+            output_format: Audio format; overrides ``channel``.
+            channel: Consumer of the audio, which picks the format:
+                'twilio' (μ-law 8kHz) or 'web' (Opus, for browser playback
+                through MediaSource).
+            cache: Reuse the clip, in memory and on disk. Only for fixed
+                phrases such as the greeting; replies may contain a
+                caller's details and are never stored.
 
         Returns:
             Raw audio bytes.
         """
         client = self._get_client()
         vid = voice_id or self._voice_id
+        output_format = output_format or OUTPUT_FORMATS[channel]
+
+        cache_key = _TTSCache.key(text, vid, model_id, output_format)
+        if cache and (cached := self._tts_cache.get(cache_key)) is not None:
+            return cached
 
         try:
-            audio_generator = client.text_to_speech.convert(
-                text=text,
-                voice_id=vid,
-                model_id=model_id,
-                output_format=output_format,
-            )
+            with self._slots:
+                audio_generator = client.text_to_speech.convert(
+                    text=text,
+                    voice_id=vid,
+                    model_id=model_id,
+                    output_format=output_format,
+                )
 
-            # Collect all audio chunks
-            audio_bytes = b""
-            for chunk in audio_generator:
-                audio_bytes += chunk
+                # Collect all audio chunks with a single final copy
+                audio_bytes = b"".join(audio_generator)
 
             logger.info(f"TTS generated: {len(audio_bytes)} bytes for {len(text)} chars")
+            if cache:
+                self._tts_cache.put(cache_key, audio_bytes)
             return audio_bytes
 
         except Exception as e:
             logger.error(f"ElevenLabs TTS error: {e}")
             raise
 
+    def cached_speech(self, text: str) -> Optional[bytes]:
+        """
+        Audio for text in the default voice and format, if already synthesized.
+
+        Checked for every spoken sentence, so only memory is consulted; the
+        phrases worth replaying from disk are loaded by :meth:`prewarm`.
+        """
+        if self._voice_id is None:
+            return None
+        return self._tts_cache.get(
+            _TTSCache.key(text, self._voice_id, TTS_MODEL_ID, OUTPUT_FORMATS["twilio"]),
+            disk=False,
+        )
+
+    def prewarm(self, phrases: list[str]):
+        """Synthesize fixed phrases ahead of time so no call waits on them."""
+        for phrase in phrases:
+            try:
+                self.text_to_speech(phrase, cache=True)
+            except Exception as e:
+                logger.warning(f"TTS prewarm failed for {phrase!r}: {e}")
+
     def text_to_speech_base64(
         self,
         text: str,
         voice_id: Optional[str] = None,
+        channel: Channel = "twilio",
+        cache: bool = False,
     ) -> str:
         """
         Convert text to speech and return as base64-encoded string.
@@ -93,16 +363,45 @@ class VoiceService:
         Args:
             text: Text to synthesize.
             voice_id: Override voice ID.
+            channel: Consumer of the audio; see :meth:`text_to_speech`.
+            cache: Reuse the clip; see :meth:`text_to_speech`.
 
         Returns:
             Base64-encoded audio string.
         """
-        audio_bytes = self.text_to_speech(text, voice_id)
-        return base64.b64encode(audio_bytes).decode("utf-8")
+        audio_bytes = self.text_to_speech(
+            text, voice_id, channel=channel, cache=cache
+        )
+        return pybase64.b64encode_as_string(audio_bytes)
+
+    def text_to_speech_base64_stream(
+        self,
+        text: str,
+        voice_id: Optional[str] = None,
+        channel: Channel = "twilio",
+        prebuffer_ms: int = PREBUFFER_MS,
+    ) -> Iterator[str]:
+        """
+        Stream TTS audio as base64 payloads, without buffering the clip.
+
+        Args:
+            text: Text to synthesize.
+            voice_id: Override voice ID.
+            channel: Consumer of the audio; see :meth:`text_to_speech`.
+            prebuffer_ms: See :meth:`text_to_speech_stream`.
+
+        Yields:
+            Base64 strings; see :func:`base64_chunks`.
+        """
+        yield from base64_chunks(
+            self.text_to_speech_stream(
+                text, voice_id, channel=channel, prebuffer_ms=prebuffer_ms
+            )
+        )
 
     def speech_to_text(
         self,
-        audio_bytes: bytes,
+        audio_bytes: bytes | memoryview,
         model_id: str = "scribe_v1",
     ) -> str:
         """
@@ -115,30 +414,22 @@ class VoiceService:
         Returns:
             Transcribed text string.
         """
-        import audioop
-        import wave
-
         client = self._get_client()
 
         try:
-            # Convert raw μ-law 8kHz mono to a proper WAV file
-            # ElevenLabs STT needs a real audio file, not raw bytes
-            linear_pcm = audioop.ulaw2lin(audio_bytes, 2)  # 16-bit PCM
-
-            wav_buffer = io.BytesIO()
-            with wave.open(wav_buffer, "wb") as wf:
-                wf.setnchannels(1)       # Mono
-                wf.setsampwidth(2)       # 16-bit
-                wf.setframerate(8000)    # 8kHz (Twilio's rate)
-                wf.writeframes(linear_pcm)
-
-            wav_buffer.seek(0)
-            wav_buffer.name = "audio.wav"
-
-            result = client.speech_to_text.convert(
-                file=wav_buffer,
-                model_id=model_id,
-            )
+            # ElevenLabs STT needs a real audio file, not raw bytes. A μ-law
+            # WAV is half the size of PCM and needs no decode; if the API
+            # ever rejects it, fall back to PCM for the rest of the process.
+            if self._stt_sends_ulaw:
+                try:
+                    result = self._transcribe(client, _ulaw_wav(audio_bytes), model_id)
+                except ApiError as e:
+                    if not _rejects_format(e):
+                        raise
+                    logger.warning(f"μ-law WAV rejected by STT, sending PCM: {e}")
+                    self._stt_sends_ulaw = False
+            if not self._stt_sends_ulaw:
+                result = self._transcribe(client, _ulaw_to_wav(audio_bytes), model_id)
 
             transcript = result.text if hasattr(result, "text") else str(result)
             logger.info(f"STT transcribed: '{transcript[:80]}...'")
@@ -148,12 +439,27 @@ class VoiceService:
             logger.error(f"ElevenLabs STT error: {e}")
             raise
 
+    def _transcribe(self, client: ElevenLabs, wav: bytes, model_id: str):
+        """Send one WAV file to ElevenLabs STT."""
+        with self._slots:
+            return client.speech_to_text.convert(
+                file=("audio.wav", wav, "audio/wav"),
+                model_id=model_id,
+            )
+
+    def incremental_transcript(self) -> "IncrementalTranscript":
+        """Start the transcript of a new utterance."""
+        return IncrementalTranscript(self)
+
     def text_to_speech_stream(
         self,
         text: str,
         voice_id: Optional[str] = None,
-        model_id: str = "eleven_turbo_v2",
-        output_format: str = "ulaw_8000",
+        model_id: str = TTS_MODEL_ID,
+        output_format: Optional[str] = None,
+        optimize_streaming_latency: int = 3,
+        channel: Channel = "twilio",
+        prebuffer_ms: int = PREBUFFER_MS,
     ):
         """
         Stream TTS audio chunks for lower latency.
@@ -162,29 +468,84 @@ class VoiceService:
             text: Text to synthesize.
             voice_id: Override voice ID.
             model_id: ElevenLabs model.
-            output_format: Audio format.
+            output_format: Audio format; overrides ``channel``.
+            optimize_streaming_latency: ElevenLabs latency level (0–4);
+                higher trades some quality for a faster first chunk.
+            channel: Consumer of the audio; see :meth:`text_to_speech`.
+            prebuffer_ms: Audio to collect before the first chunk is
+                yielded. Only the start of a reply needs it; later
+                sentences arrive while earlier audio is still playing.
 
         Yields:
             Audio byte chunks.
         """
         client = self._get_client()
         vid = voice_id or self._voice_id
+        output_format = output_format or OUTPUT_FORMATS[channel]
 
         try:
-            audio_generator = client.text_to_speech.convert(
-                text=text,
-                voice_id=vid,
-                model_id=model_id,
-                output_format=output_format,
-            )
-
-            for chunk in audio_generator:
-                yield chunk
+            # The /stream endpoint starts returning audio before synthesis
+            # of the whole text has finished. The slot is held until the
+            # stream is drained, since that is when the request ends.
+            with self._slots:
+                audio_generator = client.text_to_speech.stream(
+                    text=text,
+                    voice_id=vid,
+                    model_id=model_id,
+                    output_format=output_format,
+                    optimize_streaming_latency=optimize_streaming_latency,
+                    # The SDK otherwise waits for 1024-byte reads (128ms of
+                    # μ-law) before yielding; take bytes as they arrive.
+                    request_options={"chunk_size": None},
+                )
+
+                prebuffer = int(prebuffer_ms * _bytes_per_ms(output_format))
+                yield from _progressive_chunks(audio_generator, prebuffer)
 
         except Exception as e:
             logger.error(f"ElevenLabs TTS streaming error: {e}")
             raise
 
 
+class IncrementalTranscript:
+    """
+    Transcript of one utterance, built phrase by phrase.
+
+    Each phrase is sent to STT as soon as the caller pauses briefly, while
+    they keep talking, so once the utterance ends only its last stretch of
+    audio is still waiting on a transcription roundtrip.
+    """
+
+    def __init__(self, service: VoiceService):
+        self._service = service
+        self._pending: list[Future] = []
+
+    def add(self, audio: bytes):
+        """Start transcribing the next phrase in the background."""
+        self._pending.append(
+            self._service._stt_executor.submit(self._service.speech_to_text, audio)
+        )
+
+    def reset(self):
+        """Discard the phrases seen so far."""
+        for future in self._pending:
+            future.cancel()
+        self._pending = []
+
+    def finish(self, tail: bytes | memoryview) -> str:
+        """
+        Transcribe the audio after the last phrase and return the whole text.
+
+        Raises:
+            Exception: If transcribing any phrase failed.
+        """
+        pending, self._pending = self._pending, []
+        parts = []
+        if len(tail):
+            parts.append(self._service.speech_to_text(tail))
+        parts[:0] = [future.result() for future in pending]
+        return " ".join(part.strip() for part in parts if part and part.strip())
+
+
 # Singleton instance
 voice_service = VoiceService()
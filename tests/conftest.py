@@ -2,30 +2,54 @@
 Shared pytest fixtures for the Salon AI Voice Agent test suite.
 """
 
+from pathlib import Path
+
 import pytest
-from unittest.mock import MagicMock
+
+from app.config import Settings
+from app.services.rag_service import RAGService
 
 
-@pytest.fixture
+@pytest.fixture(scope="session")
 def mock_settings():
     """
-    Mock application settings shared across all test modules.
-    Provides sensible defaults for all config fields without
-    requiring a real .env file.
+    Application settings shared across all test modules.
+
+    A real, frozen Settings built once per session – no .env file needed.
+    Tests that need different values derive a copy with
+    ``dataclasses.replace``.
+    """
+    return Settings(
+        openrouter_api_key="test-key",
+        openrouter_model="openai/gpt-4o",
+        openrouter_max_concurrency=32,
+        elevenlabs_api_key="test-key",
+        elevenlabs_voice_id="test-voice",
+        elevenlabs_max_concurrency=10,
+        twilio_account_sid="test",
+        twilio_auth_token="test",
+        twilio_phone_number="+15559999999",
+        google_calendar_id="test@calendar.google.com",
+        google_service_account_file="test.json",
+        salon_name="Test Salon",
+        salon_timezone="America/Los_Angeles",
+        salon_phone="+15551234567",
+        log_level="INFO",
+        log_file="/tmp/test_interactions.jsonl",
+        log_max_bytes=0,
+        tts_cache_dir="/tmp/test_tts_cache",
+        rag_store_dir="/tmp/test_rag_store",
+    )
+
+
+@pytest.fixture(scope="session")
+def rag(mock_settings):
+    """
+    RAG service with the knowledge base loaded, built once per session.
+
+    Embeddings are reused from the on-disk index while the knowledge base
+    is unchanged, so later runs skip re-embedding entirely.
     """
-    settings = MagicMock()
-    settings.openrouter_api_key = "test-key"
-    settings.openrouter_model = "openai/gpt-4o"
-    settings.salon_name = "Test Salon"
-    settings.salon_timezone = "America/Los_Angeles"
-    settings.salon_phone = "+15551234567"
-    settings.elevenlabs_api_key = "test-key"
-    settings.elevenlabs_voice_id = "test-voice"
-    settings.twilio_account_sid = "test"
-    settings.twilio_auth_token = "test"
-    settings.twilio_phone_number = "+15559999999"
-    settings.google_calendar_id = "test@calendar.google.com"
-    settings.google_service_account_file = "test.json"
-    settings.log_level = "INFO"
-    settings.log_file = "/tmp/test_interactions.jsonl"
-    return settings
+    service = RAGService(store_dir=Path(mock_settings.rag_store_dir))
+    service.initialize()
+    return service
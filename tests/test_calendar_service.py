@@ -4,6 +4,7 @@ Tests for the Calendar Service.
 Uses mocks – no real Google Calendar API calls are made.
 """
 
+import asyncio
 import pytest
 from unittest.mock import patch, MagicMock
 import sys
@@ -14,16 +15,6 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 from app.services.calendar_service import CalendarService
 
 
-@pytest.fixture
-def mock_settings():
-    """Mock settings for the calendar service."""
-    settings = MagicMock()
-    settings.google_calendar_id = "test-calendar@group.calendar.google.com"
-    settings.google_service_account_file = "test-creds.json"
-    settings.salon_timezone = "America/Los_Angeles"
-    return settings
-
-
 @pytest.fixture
 def calendar_svc(mock_settings):
     """Create a CalendarService with mocked Google API."""
@@ -71,6 +62,81 @@ class TestAvailability:
         start_times = [s["start_time"] for s in slots]
         assert "10:00 AM" not in start_times
 
+    def test_get_slots_with_overlapping_busy_times(self, calendar_svc):
+        """Should skip every slot covered by nested or overlapping events."""
+        mock_events = {
+            "items": [
+                {
+                    "start": {"dateTime": "2026-03-15T10:00:00-07:00"},
+                    "end": {"dateTime": "2026-03-15T13:00:00-07:00"},
+                    "summary": "Color treatment",
+                },
+                {
+                    "start": {"dateTime": "2026-03-15T11:00:00-07:00"},
+                    "end": {"dateTime": "2026-03-15T12:00:00-07:00"},
+                    "summary": "Haircut",
+                },
+                {
+                    "start": {"dateTime": "2026-03-15T12:30:00-07:00"},
+                    "end": {"dateTime": "2026-03-15T14:00:00-07:00"},
+                    "summary": "Blowout",
+                },
+            ]
+        }
+        calendar_svc._service.events().list().execute.return_value = mock_events
+
+        slots = calendar_svc.get_available_slots(
+            date="2026-03-15", duration_minutes=60
+        )
+        start_times = [s["start_time"] for s in slots]
+        assert start_times[:3] == ["09:00", "14:00", "14:30"]
+
+    def test_get_slots_with_utc_busy_time(self, calendar_svc):
+        """Busy times returned in UTC should block the matching local slots."""
+        mock_events = {
+            "items": [
+                {
+                    "start": {"dateTime": "2026-03-15T17:00:00Z"},
+                    "end": {"dateTime": "2026-03-15T18:00:00Z"},
+                    "summary": "Existing appointment",
+                }
+            ]
+        }
+        calendar_svc._service.events().list().execute.return_value = mock_events
+
+        slots = calendar_svc.get_available_slots(
+            date="2026-03-15", duration_minutes=60
+        )
+        start_times = [s["start_time"] for s in slots]
+        assert "10:00" not in start_times
+        assert "11:00" in start_times
+
+    def test_get_slots_all_day_event_blocks_day(self, calendar_svc):
+        """An all-day event should leave no slots that day."""
+        mock_events = {
+            "items": [
+                {
+                    "start": {"date": "2026-03-15"},
+                    "end": {"date": "2026-03-16"},
+                    "summary": "Salon closed",
+                }
+            ]
+        }
+        calendar_svc._service.events().list().execute.return_value = mock_events
+
+        assert calendar_svc.get_available_slots(date="2026-03-15") == []
+
+    def test_get_slots_filters_stylist_server_side(self, calendar_svc):
+        """Should pass the stylist to the API as a free-text query."""
+        events = calendar_svc._service.events()
+        events.list().execute.return_value = {"items": []}
+
+        calendar_svc.get_available_slots(date="2026-03-15", stylist="Sophia")
+
+        kwargs = events.list.call_args.kwargs
+        assert kwargs["q"] == "Sophia"
+        assert kwargs["fields"] == "items(start,end)"
+
     def test_get_slots_error_handling(self, calendar_svc):
         """Should return empty list on API error."""
         calendar_svc._service.events().list().execute.side_effect = Exception("API error")
@@ -195,3 +261,18 @@ class TestAppointmentModification:
         result = calendar_svc.delete_appointment(event_id="event999")
         assert result["status"] == "cancelled"
         assert result["event_id"] == "event999"
+
+
+class TestAsyncVariants:
+    """Test the thread-offloaded async wrappers."""
+
+    def test_aget_available_slots(self, calendar_svc):
+        """Should return the same result as the blocking call."""
+        calendar_svc._service.events().list().execute.return_value = {"items": []}
+
+        slots = asyncio.run(
+            calendar_svc.aget_available_slots(date="2026-03-15", duration_minutes=60)
+        )
+        assert slots == calendar_svc.get_available_slots(
+            date="2026-03-15", duration_minutes=60
+        )
@@ -0,0 +1,133 @@
+"""
+Tests for the Call Orchestrator.
+
+Voice and LLM calls are mocked – no external services are contacted.
+"""
+
+import threading
+import time
+from unittest.mock import patch
+import sys
+import os
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.models.session import CallSession
+from app.services import call_orchestrator as orchestrator_module
+from app.services.call_orchestrator import CallOrchestrator
+
+
+@pytest.fixture
+def orchestrator():
+    """Create an orchestrator with interaction logging mocked out."""
+    with patch.object(orchestrator_module, "interaction_logger") as mock_logger:
+        orch = CallOrchestrator()
+        orch.mock_logger = mock_logger
+        yield orch
+
+
+class TestSessionStore:
+    """Test LRU eviction and idle reaping of call sessions."""
+
+    def test_least_recently_active_evicted_when_full(self, orchestrator):
+        """Going over the cap should end the least recently active call."""
+        with patch.object(orchestrator_module, "MAX_SESSIONS", 2):
+            orchestrator._add_session(CallSession(call_sid="CA1"))
+            orchestrator._add_session(CallSession(call_sid="CA2"))
+            orchestrator._touch_session("CA1")
+            orchestrator._add_session(CallSession(call_sid="CA3"))
+
+        assert orchestrator.get_session("CA2") is None
+        assert orchestrator.get_session("CA1") is not None
+        assert orchestrator.get_active_call_count() == 2
+        orchestrator.mock_logger.log_call_end.assert_called_once()
+
+    def test_idle_sessions_reaped(self, orchestrator):
+        """Sessions idle past the timeout should be ended; active ones kept."""
+        idle = CallSession(call_sid="CA1")
+        idle.last_activity = time.monotonic() - 3600
+        orchestrator._add_session(idle)
+        orchestrator._add_session(CallSession(call_sid="CA2"))
+
+        assert orchestrator.reap_idle_sessions() == 1
+        assert orchestrator.get_session("CA1") is None
+        assert orchestrator.get_session("CA2") is not None
+        assert not idle.is_active
+
+    def test_end_call_logs_once(self, orchestrator):
+        """Ending a call should remove it and log the end exactly once."""
+        orchestrator._add_session(CallSession(call_sid="CA1"))
+        orchestrator.end_call("CA1")
+        orchestrator.end_call("CA1")
+
+        assert orchestrator.get_active_call_count() == 0
+        orchestrator.mock_logger.log_call_end.assert_called_once()
+
+
+class TestConverse:
+    """Test the sentence-by-sentence reply pipeline."""
+
+    def test_next_sentence_synthesized_while_current_plays(self, orchestrator):
+        """Sentence two's TTS should start before sentence one is sent."""
+        sentences = ["First sentence here.", "Second sentence here."]
+        queued = threading.Event()
+        events = []
+
+        def reply_to_audio(call_sid, audio, on_sentence, on_tool_call, transcript):
+            for sentence in sentences:
+                on_sentence(sentence)
+            queued.set()
+            return " ".join(sentences)
+
+        def tts(text, prebuffer_ms):
+            events.append(f"start {text[:6]}")
+            if text == sentences[0]:
+                queued.wait(timeout=5)
+                yield b"a"
+                time.sleep(0.2)  # Still sending sentence one
+                yield b"b"
+            else:
+                yield b"c"
+
+        with patch.object(orchestrator, "reply_to_audio", side_effect=reply_to_audio), \
+             patch.object(orchestrator_module, "voice_service") as voice:
+            voice.cached_speech.return_value = None
+            voice.text_to_speech_stream.side_effect = tts
+            audio = []
+            for chunk in orchestrator.converse("CA1", b""):
+                audio.append(chunk)
+                events.append(f"sent {chunk.decode()}")
+
+        assert audio == [b"a", b"b", b"c"]
+        assert events.index("start Second") < events.index("sent b")
+        # Only the opening sentence is prebuffered
+        prebuffers = [c.kwargs["prebuffer_ms"] for c in voice.text_to_speech_stream.call_args_list]
+        assert prebuffers[0] > 0 and prebuffers[1] == 0
+
+
+class TestTextSession:
+    """Test the text-only entry point used by /voice/chat."""
+
+    def test_reply_synthesized_only_on_request(self, orchestrator):
+        """Text-only turns should skip TTS; audio requests get Opus."""
+        with patch.object(orchestrator_module, "llm_agent") as llm, \
+             patch.object(orchestrator_module, "voice_service") as voice:
+            reply = {"role": "assistant", "content": "We open at 9."}
+            llm.chat.side_effect = lambda conversation_history, **_: (
+                reply["content"], conversation_history + [reply], []
+            )
+            voice.text_to_speech_base64.return_value = "T3B1cw=="
+
+            text, audio = orchestrator.process_customer_text("T1", "Hours?")
+            assert (text, audio) == ("We open at 9.", "")
+            voice.text_to_speech_base64.assert_not_called()
+
+            _, audio = orchestrator.process_customer_text(
+                "T1", "Hours?", with_audio=True
+            )
+            assert audio == "T3B1cw=="
+            voice.text_to_speech_base64.assert_called_once_with(
+                "We open at 9.", channel="web"
+            )
@@ -0,0 +1,166 @@
+"""
+Tests for the Interaction Logger.
+
+Writes to a temporary directory – no shared log files are touched.
+"""
+
+import asyncio
+import gzip
+from dataclasses import replace
+import json
+import pytest
+from unittest.mock import patch
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.logger import interaction_logger as logger_module
+from app.logger.interaction_logger import (
+    LOG_SHARDS,
+    InteractionLogger,
+    _shard_index,
+    _shard_path,
+    merge_logs,
+)
+
+
+@pytest.fixture
+def interaction_log(mock_settings, tmp_path):
+    """Create an InteractionLogger writing into a temp directory."""
+    settings = replace(mock_settings, log_file=str(tmp_path / "interactions.jsonl"))
+    with patch("app.logger.interaction_logger.get_settings", return_value=settings):
+        il = InteractionLogger()
+        il.initialize()
+        yield il
+        il.close()
+
+
+def _read_jsonl(path):
+    with open(path, "rb") as f:
+        return [json.loads(line) for line in f]
+
+
+class TestLogging:
+    """Test writing interaction entries."""
+
+    def test_log_interaction(self, interaction_log, tmp_path):
+        """Should append one JSON line per interaction."""
+        interaction_log.log_interaction(
+            call_sid="CA123",
+            customer_transcript="I'd like a haircut",
+            agent_response="Sure! When works for you?",
+            tools_called=["check_availability"],
+        )
+        interaction_log.log_call_end("CA123", duration_seconds=12.5)
+        interaction_log.close()
+
+        log_path = tmp_path / "interactions.jsonl"
+        entries = _read_jsonl(_shard_path(log_path, _shard_index("CA123")))
+        assert len(entries) == 2
+        assert entries[0]["call_sid"] == "CA123"
+        assert entries[0]["tools_called"] == ["check_availability"]
+        assert entries[1]["extra"]["event"] == "call_ended"
+
+    def test_flush_makes_entries_visible(self, interaction_log, tmp_path):
+        """flush() should push buffered entries to disk without closing."""
+        interaction_log.log_call_start("CA456", "+15551234567")
+        interaction_log.flush()
+
+        log_path = tmp_path / "interactions.jsonl"
+        entries = _read_jsonl(_shard_path(log_path, _shard_index("CA456")))
+        assert entries[0]["customer_phone"] == "+15551234567"
+
+    def test_idle_writer_syncs_within_interval(self, mock_settings, tmp_path):
+        """A few entries followed by silence should still reach the disk."""
+        settings = replace(mock_settings, log_file=str(tmp_path / "interactions.jsonl"))
+
+        async def log_then_idle():
+            with patch.object(logger_module, "get_settings", return_value=settings):
+                il = InteractionLogger()
+                il.initialize()
+            il.log_call_start("CA789", "+15551234567")
+            await asyncio.sleep(0.3)
+            entries = _read_jsonl(
+                _shard_path(tmp_path / "interactions.jsonl", _shard_index("CA789"))
+            )
+            await il.drain()
+            il.close()
+            return entries
+
+        with patch.object(logger_module, "FSYNC_INTERVAL_SECONDS", 0.1):
+            entries = asyncio.run(log_then_idle())
+
+        assert entries[0]["customer_phone"] == "+15551234567"
+
+    def test_initialize_twice_keeps_one_set_of_shards(self, interaction_log):
+        """A second initialize() should not reopen shards or add a writer."""
+        handles = interaction_log._fhs
+
+        async def initialize_on_loop():
+            interaction_log.initialize()
+            writer = interaction_log._writer_task
+            interaction_log.initialize()
+            assert interaction_log._writer_task is writer
+            await interaction_log.drain()
+
+        with patch("atexit.register") as register:
+            interaction_log.initialize()
+            asyncio.run(initialize_on_loop())
+
+        assert interaction_log._fhs is handles
+        register.assert_not_called()
+
+
+class TestSharding:
+    """Test per-call-SID shard files and offline merging."""
+
+    def test_call_entries_share_a_shard(self, interaction_log, tmp_path):
+        """All entries of one call should land in the same shard file."""
+        for call_sid in ("CA1", "CA2", "CA3"):
+            interaction_log.log_call_start(call_sid)
+            interaction_log.log_call_end(call_sid)
+        interaction_log.close()
+
+        log_path = tmp_path / "interactions.jsonl"
+        for i in range(LOG_SHARDS):
+            for entry in _read_jsonl(_shard_path(log_path, i)):
+                assert _shard_index(entry["call_sid"]) == i
+
+    def test_merge_logs_orders_by_timestamp(self, interaction_log, tmp_path):
+        """merge_logs() should consolidate every shard in timestamp order."""
+        for i in range(20):
+            interaction_log.log_call_start(f"CA{i}")
+        interaction_log.close()
+
+        merged = merge_logs(str(tmp_path / "interactions.jsonl"))
+        entries = _read_jsonl(merged)
+        assert [e["call_sid"] for e in entries] == [f"CA{i}" for i in range(20)]
+
+
+class TestRotation:
+    """Test size-based rotation and compression."""
+
+    def test_rotates_and_gzips(self, mock_settings, tmp_path):
+        """Segments past the size limit should be rotated and gzipped."""
+        settings = replace(
+            mock_settings,
+            log_file=str(tmp_path / "interactions.jsonl"),
+            log_max_bytes=1024,
+        )
+        with patch("app.logger.interaction_logger.get_settings", return_value=settings):
+            il = InteractionLogger()
+            il.initialize()
+        for i in range(50):
+            il.log_interaction(call_sid=f"CA{i}", agent_response="x" * 50)
+        il.close()
+
+        first_shard = _shard_path(tmp_path / "interactions.jsonl", _shard_index("CA0"))
+        segments = sorted(tmp_path.glob(f"{first_shard.name}.*.gz"))
+        assert len(segments) > 0
+        with gzip.open(segments[0], "rb") as f:
+            first = json.loads(f.readline())
+        assert first["call_sid"] == "CA0"
+
+        merged = _read_jsonl(merge_logs(settings.log_file))
+        assert [e["call_sid"] for e in merged] == [f"CA{i}" for i in range(50)]
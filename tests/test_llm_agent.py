@@ -6,36 +6,20 @@ Uses mocks – no real OpenRouter API calls are made.
 
 import pytest
 import json
+import threading
+from dataclasses import replace
 from unittest.mock import patch, MagicMock
 import sys
 import os
 
+import numpy as np
+import orjson
+
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 
 from app.services.llm_agent import LLMAgent
 
 
-@pytest.fixture
-def mock_settings():
-    """Mock application settings."""
-    settings = MagicMock()
-    settings.openrouter_api_key = "test-key"
-    settings.openrouter_model = "openai/gpt-4o"
-    settings.salon_name = "Test Salon"
-    settings.salon_timezone = "America/Los_Angeles"
-    settings.salon_phone = "+15551234567"
-    settings.elevenlabs_api_key = "test-key"
-    settings.elevenlabs_voice_id = "test-voice"
-    settings.twilio_account_sid = "test"
-    settings.twilio_auth_token = "test"
-    settings.twilio_phone_number = "+15559999999"
-    settings.google_calendar_id = "test@calendar.google.com"
-    settings.google_service_account_file = "test.json"
-    settings.log_level = "INFO"
-    settings.log_file = "/tmp/test_interactions.jsonl"
-    return settings
-
-
 @pytest.fixture
 def agent(mock_settings):
     """Create an LLM agent with mocked dependencies."""
@@ -74,7 +58,7 @@ class TestLLMChat:
         mock_resp = _make_mock_response(
             "Welcome! How can I help you today?"
         )
-        agent._client.chat.completions.create.return_value = mock_resp
+        agent._client.post.return_value = mock_resp
 
         text, history, tools = agent.chat([], "Hello!", "test-sid")
 
@@ -115,7 +99,7 @@ class TestLLMChat:
             "A women's haircut is $85 and takes about an hour."
         )
 
-        agent._client.chat.completions.create.side_effect = [
+        agent._client.post.side_effect = [
             first_resp,
             second_resp,
         ]
@@ -137,12 +121,73 @@ class TestLLMChat:
         assert "$85" in text
         assert "search_knowledge_base" in tools
 
+    def test_multiple_tool_calls_run_concurrently(self, agent):
+        """Tool calls in one round should overlap, with results kept in order."""
+        tool_calls = []
+        for i, name in enumerate(["check_availability", "search_knowledge_base"]):
+            tool_call = MagicMock()
+            tool_call.id = f"tc_{i}"
+            tool_call.function.name = name
+            tool_call.function.arguments = json.dumps({"date": "2026-03-15", "query": "hours"})
+            tool_calls.append(tool_call)
+
+        agent._client.post.side_effect = [
+            _make_mock_response(None, tool_calls=tool_calls),
+            _make_mock_response("We're open and Sophia is free."),
+        ]
+
+        # Each tool waits for the other, so this only finishes if they overlap
+        barrier = threading.Barrier(2, timeout=5)
+
+        def slots(**kwargs):
+            barrier.wait()
+            return []
+
+        def kb(**kwargs):
+            barrier.wait()
+            return [{"content": "Open 9-7", "source": "faqs", "relevance_score": 0.9}]
+
+        with patch("app.services.llm_agent.calendar_service") as mock_cal, \
+             patch("app.services.llm_agent.rag_service") as mock_rag:
+            mock_cal.get_available_slots.side_effect = slots
+            mock_rag.query.side_effect = kb
+            _, _, tools = agent.chat([], "Hours, and is Sophia free?", "test-sid")
+
+        messages = orjson.loads(agent._client.post.call_args.kwargs["content"])["messages"]
+        tool_messages = [m for m in messages if m.get("role") == "tool"]
+        assert [m["tool_call_id"] for m in tool_messages] == ["tc_0", "tc_1"]
+        assert "no_slots" in tool_messages[0]["content"]
+        assert "Open 9-7" in tool_messages[1]["content"]
+        assert tools == ["check_availability", "search_knowledge_base"]
+
+    def test_tool_args_recorded_in_extracted_info(self, agent):
+        """Should copy customer details from tool args, interning names."""
+        args = {"date": "2026-03-15", "stylist": "".join(["Sophia ", "Martinez"])}
+        tool_call = MagicMock()
+        tool_call.id = "tc_1"
+        tool_call.function.name = "check_availability"
+        tool_call.function.arguments = json.dumps(args)
+
+        first_resp = _make_mock_response(None, tool_calls=[tool_call])
+        second_resp = _make_mock_response("Sophia is free at 10 AM.")
+        agent._client.post.side_effect = [first_resp, second_resp]
+
+        extracted_info = {}
+        with patch("app.services.llm_agent.calendar_service") as mock_cal:
+            mock_cal.get_available_slots.return_value = []
+            agent.chat(
+                [], "Is Sophia free Sunday?", "test-sid", extracted_info=extracted_info
+            )
+
+        assert extracted_info["stylist"] == "Sophia Martinez"
+        assert extracted_info["stylist"] is sys.intern("Sophia Martinez")
+
     def test_conversation_history_maintained(self, agent):
         """Should maintain conversation history across turns."""
         resp1 = _make_mock_response("I'd love to help! What service?")
         resp2 = _make_mock_response("Great, a haircut! Any preferred stylist?")
 
-        agent._client.chat.completions.create.side_effect = [resp1, resp2]
+        agent._client.post.side_effect = [resp1, resp2]
 
         _, history1, _ = agent.chat([], "I want to book an appointment", "test-sid")
         assert len(history1) == 2
@@ -150,14 +195,233 @@ class TestLLMChat:
         _, history2, _ = agent.chat(history1, "A haircut please", "test-sid")
         assert len(history2) == 4  # 2 from first turn + 2 from second
 
+    def test_static_prefix_reused_across_turns(self, agent):
+        """The system prompt should be one unchanging object ahead of the date."""
+        agent._client.post.side_effect = [
+            _make_mock_response("Hi!"),
+            _make_mock_response("Sure."),
+        ]
+
+        _, history, _ = agent.chat([], "Hello", "test-sid")
+        agent.chat(history, "Book me in", "test-sid")
+
+        first, second = (
+            orjson.loads(c.kwargs["content"])["messages"]
+            for c in agent._client.post.call_args_list
+        )
+        assert first[0] == second[0]
+        assert "Current Date" not in first[0]["content"]
+        assert second[1:3] == history
+        assert "Current Date" in second[-2]["content"]
+
+    def test_knowledge_base_reply_served_from_cache(self, agent):
+        """A repeated FAQ should be answered from the semantic cache."""
+        from app.services.semantic_cache import SemanticCache
+
+        cache = SemanticCache()
+        cache.embed = MagicMock(return_value=np.array([1.0, 0.0], dtype=np.float32))
+
+        tool_call = MagicMock()
+        tool_call.id = "tc_1"
+        tool_call.function.name = "search_knowledge_base"
+        tool_call.function.arguments = json.dumps({"query": "hours"})
+        agent._client.post.side_effect = [
+            _make_mock_response(None, tool_calls=[tool_call]),
+            _make_mock_response("We open at 9 AM."),
+        ]
+
+        with patch("app.services.llm_agent.semantic_cache", cache), \
+             patch("app.services.llm_agent.rag_service") as mock_rag:
+            mock_rag.query.return_value = []
+            agent.chat([], "What are your hours?", "test-sid")
+            text, history, tools = agent.chat([], "When do you open?", "test-sid")
+
+        assert agent._client.post.call_count == 2
+        assert text == "We open at 9 AM."
+        assert tools == []
+        assert history[-1] == {"role": "assistant", "content": text}
+
+    def test_reply_to_named_caller_not_shared(self, agent):
+        """A reply addressing one caller by name must not reach another call."""
+        from app.services.semantic_cache import SemanticCache
+
+        cache = SemanticCache()
+        cache.embed = MagicMock(return_value=np.array([1.0, 0.0], dtype=np.float32))
+
+        tool_call = MagicMock()
+        tool_call.id = "tc_1"
+        tool_call.function.name = "search_knowledge_base"
+        tool_call.function.arguments = json.dumps({"query": "hours"})
+        agent._client.post.side_effect = [
+            _make_mock_response(None, tool_calls=[tool_call]),
+            _make_mock_response("Sure Maria, we open at 9 AM."),
+            _make_mock_response(None, tool_calls=[tool_call]),
+            _make_mock_response("We open at 9 AM."),
+        ]
+        history = [
+            {"role": "user", "content": "Hi, this is Maria."},
+            {"role": "assistant", "content": "Hi! How can I help?"},
+        ]
+
+        with patch("app.services.llm_agent.semantic_cache", cache), \
+             patch("app.services.llm_agent.rag_service") as mock_rag:
+            mock_rag.query.return_value = []
+            agent.chat(history, "What are your hours?", "CA-first")
+            text, _, _ = agent.chat([], "What are your hours?", "CA-second")
+
+        assert agent._client.post.call_count == 4
+        assert text == "We open at 9 AM."
+
+    def test_history_trimmed_to_token_budget(self, agent):
+        """Long histories should be cut from the middle in the request only."""
+        history = [
+            {"role": "user" if i % 2 == 0 else "assistant", "content": f"{i} " + "x" * 2000}
+            for i in range(20)
+        ]
+        agent._client.post.return_value = _make_mock_response("Sure.")
+
+        _, updated, _ = agent.chat(history, "Latest question", "test-sid")
+
+        sent = orjson.loads(agent._client.post.call_args.kwargs["content"])["messages"]
+        sent_history = [m for m in sent if m["role"] != "system"][:-1]
+        assert sent_history[:2] == history[:2]
+        assert sent_history[-1] == history[-1]
+        assert len(sent_history) < len(history)
+        assert updated[:20] == history
+        assert len(updated) == 22
+
     def test_api_error_handling(self, agent):
         """Should return a fallback message on API error."""
-        agent._client.chat.completions.create.side_effect = Exception("API timeout")
+        agent._client.post.side_effect = Exception("API timeout")
 
         text, history, tools = agent.chat([], "Hello", "test-sid")
 
         assert "sorry" in text.lower() or "trouble" in text.lower()
 
+    def test_request_holds_concurrency_slot(self, agent):
+        """Each OpenRouter request should run inside a concurrency slot."""
+        agent._slots = threading.BoundedSemaphore(1)
+        slot_taken = []
+
+        def post(*args, **kwargs):
+            slot_taken.append(not agent._slots.acquire(blocking=False))
+            return _make_mock_response("Hi there!")
+
+        agent._client.post.side_effect = post
+        agent.chat([], "Hello", "test-sid")
+
+        assert slot_taken == [True]
+        assert agent._slots.acquire(blocking=False)  # Released afterwards
+
+    def test_slots_sized_from_settings_before_initialize(self, agent, mock_settings):
+        """The configured limit should apply even if initialize() never ran."""
+        settings = replace(mock_settings, openrouter_max_concurrency=2)
+        with patch("app.services.llm_agent.get_settings", return_value=settings):
+            slots = agent._concurrency_slots()
+
+        assert slots.acquire(blocking=False) and slots.acquire(blocking=False)
+        assert not slots.acquire(blocking=False)
+
+
+def _make_stream_chunk(content=None, tool_calls=None):
+    """Helper to create one chunk of a streamed chat completion."""
+    chunk = MagicMock()
+    chunk.choices[0].delta.content = content
+    chunk.choices[0].delta.tool_calls = tool_calls
+    return chunk
+
+
+def _make_tool_call_delta(index, id=None, name=None, arguments=None):
+    """Helper to create a partial tool call from a streamed chunk."""
+    delta = MagicMock()
+    delta.index = index
+    delta.id = id
+    delta.function.name = name
+    delta.function.arguments = arguments
+    return delta
+
+
+class TestLLMChatStreaming:
+    """Test the streamed chat path used for sentence-by-sentence TTS."""
+
+    def test_sentences_emitted_as_they_complete(self, agent):
+        """Each finished sentence should be passed on before the reply ends."""
+        pieces = ["Sure! We", " open at 9", " AM. See", " you then."]
+        agent._client.post.return_value = iter(
+            _make_stream_chunk(p) for p in pieces
+        )
+
+        sentences = []
+        text, history, _ = agent.chat(
+            [], "When do you open?", "test-sid", on_sentence=sentences.append
+        )
+
+        # "Sure!" is too short to send to TTS alone, so it leads the next one
+        assert sentences == ["Sure! We open at 9 AM.", "See you then."]
+        assert text == "Sure! We open at 9 AM. See you then."
+        assert history[-1] == {"role": "assistant", "content": text}
+
+    def test_opening_clause_spoken_early(self, agent):
+        """The first chunk should go out at a clause break, later ones at sentences."""
+        pieces = ["Of course, I can", " book that, no", " problem. Which day", " works best?"]
+        agent._client.post.return_value = iter(
+            _make_stream_chunk(p) for p in pieces
+        )
+
+        sentences = []
+        agent.chat([], "Book me in", "test-sid", on_sentence=sentences.append)
+
+        # "Of course," is too short; the next clause break is used instead
+        assert sentences == [
+            "Of course, I can book that,",
+            "no problem.",
+            "Which day works best?",
+        ]
+
+    def test_abbreviations_do_not_end_sentences(self, agent):
+        """Titles and a.m./p.m. should not split a sentence."""
+        pieces = ["Dr. Lee is", " in at 9 a.m.", " tomorrow. Want", " that slot?"]
+        agent._client.post.return_value = iter(
+            _make_stream_chunk(p) for p in pieces
+        )
+
+        sentences = []
+        agent.chat([], "Is Dr. Lee in?", "test-sid", on_sentence=sentences.append)
+
+        assert sentences == ["Dr. Lee is in at 9 a.m. tomorrow.", "Want that slot?"]
+
+    def test_streamed_tool_call_assembled(self, agent):
+        """Tool call fragments should be joined and executed before replying."""
+        args = json.dumps({"query": "haircut price"})
+        first = iter([
+            _make_stream_chunk(tool_calls=[_make_tool_call_delta(
+                0, id="tc_1", name="search_knowledge_base", arguments=args[:10]
+            )]),
+            _make_stream_chunk(tool_calls=[_make_tool_call_delta(
+                0, arguments=args[10:]
+            )]),
+        ])
+        second = iter([_make_stream_chunk("It's $85.")])
+        agent._client.post.side_effect = [first, second]
+
+        sentences = []
+        announced = []
+        with patch("app.services.llm_agent.rag_service") as mock_rag:
+            mock_rag.query.return_value = []
+            text, _, tools = agent.chat(
+                [],
+                "How much?",
+                "test-sid",
+                on_sentence=sentences.append,
+                on_tool_call=announced.append,
+            )
+
+        mock_rag.query.assert_called_once_with(question="haircut price", top_k=3)
+        assert announced == ["search_knowledge_base"]
+        assert tools == ["search_knowledge_base"]
+        assert sentences == ["It's $85."]
+        assert text == "It's $85."
+
 
 class TestGreeting:
     """Test greeting generation."""
@@ -169,3 +433,19 @@ class TestGreeting:
             greeting = agent.get_greeting()
 
         assert "Test Salon" in greeting
+
+
+class TestToolDefinitions:
+    """Test the shared tool schema."""
+
+    def test_schema_is_read_only_and_matches_payload(self):
+        """The schema cannot be mutated and is exactly what gets sent."""
+        from app.prompts.salon_agent import TOOL_DEFINITIONS, TOOL_DEFINITIONS_JSON
+
+        with pytest.raises(TypeError):
+            TOOL_DEFINITIONS[0]["function"]["name"] = "changed"
+
+        payload = orjson.loads(TOOL_DEFINITIONS_JSON)
+        assert [t["function"]["name"] for t in payload] == [
+            t["function"]["name"] for t in TOOL_DEFINITIONS
+        ]
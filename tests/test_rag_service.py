@@ -5,31 +5,26 @@ Tests the knowledge base loading, embedding, and retrieval
 without requiring any external API calls.
 """
 
-import pytest
 import sys
 import os
+from unittest.mock import MagicMock
+
+import numpy as np
 
 # Add project root to path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 
+from app.services import rag_service as rag_module
 from app.services.rag_service import RAGService
 
 
-@pytest.fixture(scope="module")
-def rag():
-    """Create and initialize a RAG service for testing."""
-    service = RAGService()
-    service.initialize()
-    return service
-
-
 class TestRAGInitialization:
     """Test knowledge base loading and indexing."""
 
     def test_initialization(self, rag):
-        """RAG service should initialize and populate the collection."""
-        assert rag._collection is not None
-        assert rag._collection.count() > 0
+        """RAG service should initialize and populate the index."""
+        assert rag._matrix is not None
+        assert rag._matrix.shape[0] == len(rag._documents) > 0
         assert rag._raw_data is not None
 
     def test_has_services(self, rag):
@@ -45,6 +40,57 @@ class TestRAGInitialization:
         assert all("name" in s for s in stylists)
 
 
+class TestRAGIndexPersistence:
+    """Test reuse of persisted embeddings across restarts."""
+
+    @staticmethod
+    def _fake_model():
+        model = MagicMock()
+        model.encode.side_effect = lambda texts, **_: np.full((len(texts), 4), 0.5, np.float32)
+        return model
+
+    def test_unchanged_kb_skips_reembedding(self, tmp_path):
+        """A second start with the same knowledge base should not re-encode."""
+        first = RAGService(store_dir=tmp_path)
+        first._model = self._fake_model()
+        first.initialize()
+        second = RAGService(store_dir=tmp_path)
+        second._model = self._fake_model()
+        second.initialize()
+
+        assert first._model.encode.call_count == 1
+        second._model.encode.assert_not_called()
+        np.testing.assert_array_equal(first._matrix, second._matrix)
+
+    def test_changed_kb_reembeds(self, tmp_path):
+        """A stale index (different hash) should be rebuilt."""
+        cache = tmp_path / rag_module.INDEX_FILE_NAME
+        np.savez(cache, matrix=np.zeros((1, 4), np.float32), kb_hash=np.array("stale"))
+        service = RAGService(store_dir=tmp_path)
+        service._model = self._fake_model()
+        service.initialize()
+
+        service._model.encode.assert_called_once()
+        assert service._matrix.shape[0] == len(service._documents)
+
+    def test_unnormalized_index_reembeds(self, tmp_path):
+        """Persisted rows that are not unit length should not be reused."""
+        cache = tmp_path / rag_module.INDEX_FILE_NAME
+        service = RAGService(store_dir=tmp_path)
+        service._model = self._fake_model()
+        service.initialize()
+        with np.load(cache) as saved:
+            kb_hash = saved["kb_hash"]
+        np.savez(cache, matrix=service._matrix * 2, kb_hash=kb_hash)
+
+        restarted = RAGService(store_dir=tmp_path)
+        restarted._model = self._fake_model()
+        restarted.initialize()
+
+        restarted._model.encode.assert_called_once()
+        np.testing.assert_allclose(np.linalg.norm(restarted._matrix, axis=1), 1.0)
+
+
 class TestRAGRetrieval:
     """Test semantic search retrieval."""
 
@@ -112,6 +158,11 @@ class TestRAGLookup:
         assert svc["price"] == 85
         assert svc["duration_minutes"] == 60
 
+    def test_get_service_by_name_ignores_case(self, rag):
+        """Should match service names case-insensitively."""
+        svc = rag.get_service_by_name("women's haircut & STYLE")
+        assert svc is rag.get_service_by_name("Women's Haircut & Style")
+
     def test_get_service_not_found(self, rag):
         """Should return None for a non-existent service."""
         svc = rag.get_service_by_name("Invisible Ink Tattoo")
@@ -0,0 +1,143 @@
+"""
+Tests for the semantic response cache.
+
+Uses hand-made unit vectors – the embedding model is never loaded.
+"""
+
+import sys
+import os
+import zlib
+from unittest.mock import patch
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services import semantic_cache as cache_module
+from app.services.semantic_cache import SemanticCache, is_shareable
+
+
+def _unit(*values) -> np.ndarray:
+    """Helper to build a normalized float32 embedding."""
+    vector = np.asarray(values, dtype=np.float32)
+    return vector / np.linalg.norm(vector)
+
+
+def _fake_embed(text: str) -> np.ndarray:
+    """Deterministic stand-in for the model: distinct texts are near-orthogonal."""
+    rng = np.random.default_rng(zlib.crc32(text.encode()))
+    return _unit(*rng.standard_normal(256))
+
+
+class TestSemanticCache:
+    """Test lookup, expiry and eviction of cached replies."""
+
+    def test_similar_question_hits(self):
+        """A near-identical question should reuse the cached reply."""
+        cache = SemanticCache(threshold=0.93)
+        cache.store(_unit(1, 0, 0), "We open at 9 AM.")
+
+        assert cache.lookup(_unit(1, 0.1, 0)) == "We open at 9 AM."
+
+    def test_dissimilar_question_misses(self):
+        """An unrelated question should not match."""
+        cache = SemanticCache(threshold=0.93)
+        cache.store(_unit(1, 0, 0), "We open at 9 AM.")
+
+        assert cache.lookup(_unit(0, 1, 0)) is None
+
+    def test_no_embedding_is_a_no_op(self):
+        """Without a loaded model, lookups miss and stores are ignored."""
+        cache = SemanticCache()
+        cache.store(None, "We open at 9 AM.")
+
+        assert cache.lookup(None) is None
+        assert cache.lookup(_unit(1, 0, 0)) is None
+
+    def test_expired_entries_dropped(self):
+        """Replies past their TTL should no longer be served."""
+        cache = SemanticCache(ttl_seconds=0)
+        cache.store(_unit(1, 0, 0), "We open at 9 AM.")
+
+        assert cache.lookup(_unit(1, 0, 0)) is None
+
+    def test_oldest_entry_evicted_when_full(self):
+        """The oldest reply should make room once the cache is full."""
+        cache = SemanticCache(max_entries=2)
+        cache.store(_unit(1, 0, 0), "first")
+        cache.store(_unit(0, 1, 0), "second")
+        cache.store(_unit(0, 0, 1), "third")
+
+        assert cache.lookup(_unit(1, 0, 0)) is None
+        assert cache.lookup(_unit(0, 1, 0)) == "second"
+        assert cache.lookup(_unit(0, 0, 1)) == "third"
+
+    def test_audio_kept_only_for_cached_replies(self):
+        """Audio should be wanted for cached sentences and dropped with them."""
+        cache = SemanticCache(max_entries=1)
+        cache.store(
+            _unit(1, 0, 0),
+            "We open at 9 AM. See you soon!",
+            ["We open at 9 AM.", "See you soon!"],
+        )
+
+        assert cache.wants_audio("See you soon!")
+        assert not cache.wants_audio("Something else.")
+        assert not cache.wants_audio("See you")  # Not a whole sentence
+        cache.store_audio("See you soon!", b"\x01\x02")
+        assert cache.audio_for("See you soon!") == b"\x01\x02"
+        assert not cache.wants_audio("See you soon!")
+
+        cache.store(_unit(0, 1, 0), "Goodbye.")
+        assert cache.audio_for("See you soon!") is None
+
+    def test_key_includes_previous_agent_turn(self):
+        """A reply stored in one conversation must not answer another."""
+        cache = SemanticCache()
+        with patch.object(cache_module, "rag_service") as rag:
+            rag.embed.side_effect = _fake_embed
+            assert cache.embed("yes", "Would you like the 9 AM slot?") is None
+
+            question = "Do you offer balayage?"
+            cache.store(cache.embed(question, "How can I help?"), "We do!")
+
+            assert cache.lookup(cache.embed(question, "How can I help?")) == "We do!"
+            assert cache.lookup(cache.embed(question, "Anything else?")) is None
+            assert cache.lookup(cache.embed("yes", "How can I help?")) is None
+
+    def test_shared_sentence_audio_survives_older_entry(self):
+        """Audio for a sentence two replies share should outlive the older one."""
+        cache = SemanticCache(max_entries=2)
+        cache.store(_unit(1, 0, 0), "Yes. We do.", ["Yes.", "We do."])
+        cache.store(_unit(0, 1, 0), "Yes. We open at 9.", ["Yes.", "We open at 9."])
+        cache.store_audio("Yes.", b"\x01")
+
+        cache.store(_unit(0, 0, 1), "Goodbye.")
+
+        assert cache.audio_for("Yes.") == b"\x01"
+        assert cache.wants_audio("We open at 9.")
+        assert not cache.wants_audio("We do.")
+
+
+class TestShareable:
+    """Test the check that keeps personal replies out of the shared cache."""
+
+    def test_generic_reply_is_shareable(self):
+        """A plain FAQ answer should be cached."""
+        assert is_shareable(
+            "We open at 9 AM, Monday to Saturday.", ["What are your hours?"]
+        )
+
+    def test_reply_naming_the_caller_is_not(self):
+        """A name the caller gave, or a known detail, should block caching."""
+        assert not is_shareable("Sure Maria, we open at 9 AM.", ["Hi, Maria here."])
+        assert not is_shareable(
+            "Sure thing, maria!", ["hours?"], {"customer_name": "Maria"}
+        )
+
+    def test_phone_numbers_and_dates_are_not(self):
+        """Phone numbers and calendar dates should block caching."""
+        assert not is_shareable("We'll text 555-123-4567.", [])
+        assert not is_shareable("We're closed on March 5.", [])
+        assert not is_shareable("We're closed on 12/24.", [])
+        assert is_shareable("A cut takes 45 - 60 minutes.", [])
@@ -0,0 +1,198 @@
+"""
+Tests for the Voice Service.
+
+The ElevenLabs client is mocked – no audio is synthesized.
+"""
+
+from unittest.mock import MagicMock
+import base64
+import pytest
+import io
+import sys
+import os
+import wave
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from app.services.voice_service import (
+    FIRST_FRAME_BYTES,
+    MAX_FRAME_BYTES,
+    VoiceService,
+    _bytes_per_ms,
+    _progressive_chunks,
+    _TTSCache,
+    _ulaw_to_wav,
+    _ulaw_wav,
+    base64_chunks,
+)
+from elevenlabs.core.api_error import ApiError
+
+
+class TestTTSCache:
+    """Test reuse of synthesized clips."""
+
+    def test_repeated_phrase_synthesized_once(self, tmp_path):
+        """A phrase already synthesized should not hit ElevenLabs again."""
+        service = VoiceService()
+        service._client = MagicMock()
+        service._voice_id = "voice"
+        service._tts_cache = _TTSCache(directory=tmp_path)
+        service._client.text_to_speech.convert.return_value = iter([b"ab", b"cd"])
+
+        first = service.text_to_speech("One moment, please.", cache=True)
+        second = service.text_to_speech("One moment, please.", cache=True)
+
+        assert first == second == b"abcd"
+        service._client.text_to_speech.convert.assert_called_once()
+        assert service.cached_speech("One moment, please.") == b"abcd"
+        assert service.cached_speech("Something new.") is None
+
+    def test_replies_not_stored(self, tmp_path):
+        """Text not marked cacheable should stay out of memory and off disk."""
+        service = VoiceService()
+        service._client = MagicMock()
+        service._voice_id = "voice"
+        service._tts_cache = _TTSCache(directory=tmp_path)
+        service._client.text_to_speech.convert.side_effect = lambda **_: iter([b"x"])
+
+        service.text_to_speech("See you Friday, Jane!")
+
+        assert service.cached_speech("See you Friday, Jane!") is None
+        assert list(tmp_path.iterdir()) == []
+
+    def test_web_channel_uses_opus(self, tmp_path):
+        """Web consumers should get Opus; the phone path stays μ-law."""
+        service = VoiceService()
+        service._client = MagicMock()
+        service._voice_id = "voice"
+        service._tts_cache = _TTSCache(directory=tmp_path)
+        service._client.text_to_speech.convert.side_effect = lambda **_: iter([b"x"])
+
+        service.text_to_speech("Hello!", channel="web")
+        service.text_to_speech("Hello!")
+
+        formats = [
+            c.kwargs["output_format"]
+            for c in service._client.text_to_speech.convert.call_args_list
+        ]
+        assert formats == ["opus_48000_32", "ulaw_8000"]
+
+    def test_clips_persist_across_restarts(self, tmp_path):
+        """Clips written by one process should be read back by the next."""
+        key = _TTSCache.key("Hello!", "voice", "model", "ulaw_8000")
+        _TTSCache(directory=tmp_path).put(key, b"audio")
+
+        assert _TTSCache(directory=tmp_path).get(key) == b"audio"
+
+    def test_evicts_least_recently_used_over_budget(self):
+        """The in-memory cache should stay within its byte budget."""
+        cache = _TTSCache(max_bytes=10, directory=None)
+        cache.put("a", b"12345")
+        cache.put("b", b"12345")
+        cache.get("a")  # "b" is now least recently used
+        cache.put("c", b"12345")
+
+        assert cache.get("a") == b"12345"
+        assert cache.get("b") is None
+        assert cache.get("c") == b"12345"
+
+
+class TestSpeechToTextEncoding:
+    """Test the μ-law to WAV conversion sent to STT."""
+
+    def test_wav_is_valid_8khz_mono_pcm(self):
+        """The WAV should parse and decode μ-law silence and peaks correctly."""
+        wav = _ulaw_to_wav(memoryview(b"\xff\x7f\x00\x80"))
+
+        with wave.open(io.BytesIO(wav)) as wf:
+            assert (wf.getnchannels(), wf.getsampwidth(), wf.getframerate()) == (1, 2, 8000)
+            frames = wf.readframes(wf.getnframes())
+
+        samples = [int.from_bytes(frames[i:i + 2], "little", signed=True) for i in range(0, 8, 2)]
+        assert samples == [0, 0, -32124, 32124]
+
+
+    def test_ulaw_wav_carries_raw_bytes(self):
+        """The μ-law WAV should declare format 7 and hold the bytes as-is."""
+        raw = bytes(range(256)) * 4
+        wav = _ulaw_wav(memoryview(raw))
+
+        assert wav[:4] == b"RIFF" and wav[8:12] == b"WAVE"
+        assert int.from_bytes(wav[4:8], "little") == len(wav) - 8
+        assert int.from_bytes(wav[20:22], "little") == 7  # WAVE_FORMAT_MULAW
+        assert int.from_bytes(wav[24:28], "little") == 8000
+        assert wav[50:54] == b"data"
+        assert wav[58:] == raw
+
+    def test_falls_back_to_pcm_when_ulaw_rejected(self):
+        """A rejected μ-law upload should be retried, and later sent, as PCM."""
+        service = VoiceService()
+        service._client = MagicMock()
+        uploads = []
+
+        def convert(file, model_id):
+            uploads.append(file[1])
+            if len(uploads) == 1:
+                raise ApiError(status_code=400, body="unsupported format")
+            return MagicMock(text="hello")
+
+        service._client.speech_to_text.convert.side_effect = convert
+
+        assert service.speech_to_text(b"\xff" * 160) == "hello"
+        assert service.speech_to_text(b"\xff" * 160) == "hello"
+
+        formats = [int.from_bytes(u[20:22], "little") for u in uploads]
+        assert formats == [7, 1, 1]
+
+    def test_unrelated_bad_request_keeps_ulaw(self):
+        """A 400 about the clip itself should not switch later uploads to PCM."""
+        service = VoiceService()
+        service._client = MagicMock()
+        service._client.speech_to_text.convert.side_effect = ApiError(
+            status_code=400, body={"detail": "Audio is too short."}
+        )
+
+        with pytest.raises(ApiError):
+            service.speech_to_text(b"\xff" * 8)
+
+        assert service._stt_sends_ulaw
+        service._client.speech_to_text.convert.assert_called_once()
+
+
+class TestStreamFraming:
+    """Test re-chunking of streamed TTS audio."""
+
+    def test_frames_grow_from_first_to_max_size(self):
+        """Small reads coalesce into 20ms, 40ms, ... frames capped at 200ms."""
+        reads = [bytes([i % 256]) * 40 for i in range(200)]  # 8000 bytes
+
+        frames = list(_progressive_chunks(iter(reads)))
+
+        assert b"".join(frames) == b"".join(reads)
+        assert len(frames[0]) == FIRST_FRAME_BYTES
+        assert [len(f) for f in frames[1:4]] == [320, 640, 1280]
+        assert all(len(f) == MAX_FRAME_BYTES for f in frames[4:-1])
+
+    def test_prebuffer_holds_back_first_frame(self):
+        """With a prebuffer, nothing is yielded until it has filled."""
+        reads = [b"\x00" * 100] * 50  # 5000 bytes
+
+        frames = list(_progressive_chunks(iter(reads), 4000))
+
+        assert len(frames[0]) == 4000
+        assert b"".join(frames) == b"".join(reads)
+
+    def test_bytes_per_ms_by_format(self):
+        """The prebuffer size should follow the output format."""
+        assert _bytes_per_ms("ulaw_8000") == 8
+        assert _bytes_per_ms("pcm_16000") == 32
+        assert _bytes_per_ms("opus_48000_32") == 4
+
+    def test_base64_chunks_match_whole_encoding(self):
+        """Payloads should each decode alone and join to the full encoding."""
+        reads = [b"\x01" * n for n in (160, 1, 0, 2, 320, 7)]
+
+        payloads = list(base64_chunks(iter(reads)))
+
+        assert "".join(payloads) == base64.b64encode(b"".join(reads)).decode()
+        assert b"".join(base64.b64decode(p) for p in payloads) == b"".join(reads)
@@ -0,0 +1,126 @@
+"""
+Tests for the media stream audio helpers.
+
+Pure audio logic – no WebSocket, Twilio, or ElevenLabs calls are made.
+"""
+
+import math
+import random
+import threading
+from unittest.mock import patch
+import sys
+import os
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import pybase64
+
+from app.routes import voice
+from app.routes.voice import (
+    PHRASE_PAUSE,
+    SILENCE_THRESHOLD,
+    SPEECH_RMS_THRESHOLD,
+    _SpeechDetector,
+    _is_speech,
+    _ulaw_to_linear,
+)
+
+
+def _reference_is_speech(chunk: bytes) -> bool:
+    """Decode, then RMS with a sqrt – the textbook check."""
+    sum_sq = sum(_ulaw_to_linear(b) ** 2 for b in chunk)
+    return int(math.sqrt(sum_sq / len(chunk))) > SPEECH_RMS_THRESHOLD
+
+
+class TestSpeechDetection:
+    """Test the per-frame energy check."""
+
+    def test_silence_is_not_speech(self):
+        """Digital silence should never count as speech."""
+        assert not _is_speech(b"\xff" * 160)
+        assert not _is_speech(b"\x7f" * 160)
+
+    def test_loud_frame_is_speech(self):
+        """A high-amplitude frame should count as speech."""
+        assert _is_speech(b"\x10" * 160)
+
+    def test_sum_of_squares_matches_rms(self):
+        """The sqrt-free fallback should agree with RMS on every frame."""
+        rng = random.Random(0)
+        # Bytes near the threshold, where rounding matters most
+        quiet = [0xFF, 0xFE, 0xFD, 0xF0, 0xE8, 0xE0, 0xDF, 0x7F, 0x70, 0x68]
+        frames = [bytes(rng.choice(quiet) for _ in range(160)) for _ in range(500)]
+
+        with patch.object(voice, "audioop", None):
+            for frame in frames:
+                assert _is_speech(frame) == _reference_is_speech(frame)
+
+
+class TestSpeechDetector:
+    """Test utterance segmentation on the detector thread."""
+
+    def test_cuts_utterance_after_pause(self):
+        """Speech followed by a pause should produce one utterance."""
+        utterances = []
+        done = threading.Event()
+
+        def on_utterance(audio, transcript):
+            assert transcript is None
+            utterances.append(bytes(audio))
+            voice._BUFFER_POOL.release(audio)
+            done.set()
+
+        detector = _SpeechDetector("test", on_utterance)
+        loud = pybase64.b64encode_as_string(b"\x10" * 160)
+        quiet = pybase64.b64encode_as_string(b"\xff" * 160)
+        for _ in range(25):
+            detector.feed(loud)
+        for _ in range(SILENCE_THRESHOLD):
+            detector.feed(quiet)
+        detector.close()
+
+        assert done.wait(timeout=5)
+        assert len(utterances) == 1
+        assert len(utterances[0]) == (25 + SILENCE_THRESHOLD) * 160
+        assert utterances[0].startswith(b"\x10" * 160)
+
+    def test_phrases_transcribed_before_utterance_ends(self):
+        """Phrases ended by short pauses should reach the transcript early."""
+        phrases = []
+        handed_off = []
+        done = threading.Event()
+
+        class FakeTranscript:
+            def add(self, audio):
+                phrases.append(audio)
+
+            def reset(self):
+                phrases.clear()
+
+        def on_utterance(audio, transcript):
+            handed_off.append((bytes(audio), transcript))
+            voice._BUFFER_POOL.release(audio)
+            done.set()
+
+        detector = _SpeechDetector("test", on_utterance, FakeTranscript)
+        loud = pybase64.b64encode_as_string(b"\x10" * 160)
+        quiet = pybase64.b64encode_as_string(b"\xff" * 160)
+        for _ in range(25):
+            detector.feed(loud)
+        for _ in range(PHRASE_PAUSE):
+            detector.feed(quiet)
+        for _ in range(25):
+            detector.feed(loud)
+        for _ in range(SILENCE_THRESHOLD):
+            detector.feed(quiet)
+        detector.close()
+
+        assert done.wait(timeout=5)
+        # Both phrases were handed over at their pauses, leaving a silent tail
+        assert [len(p) for p in phrases] == [
+            (25 + PHRASE_PAUSE) * 160,
+            (25 + PHRASE_PAUSE) * 160,
+        ]
+        tail, transcript = handed_off[0]
+        assert tail == b""
+        assert isinstance(transcript, FakeTranscript)